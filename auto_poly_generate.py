@@ -10,7 +10,7 @@ is specified as well.
 
 After reading in the contents of a data file, further manipulations are
 possible, using the functions from the `iv_manipulate module'. To do so,
-manually uncomment / comment the manipulations you want to make.
+edit the `manipulations` list with the ones you want to make.
 
 For each file, a graph is drawn, containing both the measured data, and the
 result of a polynomial fit to it. Furthermore, a polynomial in format suitable
@@ -19,6 +19,9 @@ for use in Agilent/Keysight ADS is created.
 For each folder, these polynomials are saved in a txt file, which has the word
 `autopoly` in it.
 
+Files are independent of each other, so they can be spread over a pool of
+`workers` processes. Output does not depend on the number of workers.
+
 Work is in progress to move to command-line specified parameters and more
 general form of the function.
 
@@ -29,66 +32,292 @@ Created on Tue Aug 05 15:23:28 2014
 
 from __future__ import print_function
 import os
+import collections
+import multiprocessing
 import numpy as np
+import matplotlib
+matplotlib.use('Agg')  # figures are only ever saved, never shown
 import matplotlib.pyplot as plt
 import warnings
 import elvd_tools
 import iv_manipulate
+import poly_cache
+import ivm_load
+import meta_index
 
 
 startdir = r'D:\projects\phd_helper\rtd\hamza'
-degree = 60  # degree of fitted polynomial
-
-warnings.simplefilter('ignore', np.RankWarning)
-
-for dirname, subdirlist, filelist in os.walk(startdir):
-    os.chdir(dirname)
-
-    # get all files with I-V measurements
-    gen = (fname for fname in filelist if
-           os.path.splitext(fname)[1] == '.ivm')
-
-    polynoms = dict()
-
-    for fname in gen:
-        data = np.loadtxt(fname, skiprows=1)
-        data[:, 1] /= 1e-3  # convert to mA
-
-        # I-V scaling routines
-        data = iv_manipulate.make_symmetric(data, quadrant='neg')
-        data = iv_manipulate.extract_region(data, 'pdr')
-        data = iv_manipulate.scale_iv(data, factor=0.1)
-
-        fit, coeffs = elvd_tools.fit_poly(data, degree)
-        polynom = elvd_tools.poly_to_ads_string(coeffs)
-        bundle = np.array([data, fit])
-
-        name, ext = os.path.splitext(fname)
-        name = name.split('_')
-        device_id = ' '.join(name[1:3])
-        plot_title = ' '.join([device_id, 'sample', name[3]])
-
-        try:  # plot graph
-            elvd_tools.custom_plot(data=data, xlabel='Voltage, [V]',
-                                   ylabel='Current, [mA]', mode='linear',
-                                   title=plot_title)
-            # a bit of magic, dependent on filenames following certain pattern
-            name = '_'.join(name[1:4])
-            name = '_'.join([name, 'sym_neg'])
-            name = '.'.join([name, 'jpg'])
-            plt.savefig(name, dpi=600)
-            plt.close()
-        except IndexError as e:
-            print(e.message)
+degree = 60  # degree of fitted polynomial, or highest one if `target` set
+target = None  # residual in mA, picks lowest degree meeting it if not None
+method = 'polyfit'  # fitting backend, see `elvd_tools.fit_poly`
+ads_form = 'horner'  # see `elvd_tools.poly_to_ads_string`
+workers = multiprocessing.cpu_count()  # processes used, 1 to run serially
+plot_dpi = 600  # resolution of graphs, dense data is reduced to match it
+
+# I-V manipulations, applied in order, as (function name, parameters)
+manipulations = [('make_symmetric', {'quadrant': 'neg'}),
+                 ('extract_region', {'region': 'pdr', 'method': 'prominence'}),
+                 ('scale', {'factor': 0.1})]
+
+# only files matching these, see `meta_index.select`, None for all files
+selection = None
+# names of measurement files, scanned once, None to scan the tree every run
+index_fname = os.path.join(startdir, '.autopoly_index.json')
+rebuild_index = False  # True to scan again, e.g. after adding files
+
+# fits are reused until the file, `manipulations` or `degree` change
+cache_dir = os.path.join(startdir, '.autopoly_cache')  # None to disable
+cache_size = 256 * 2**20  # in bytes
+# parsed measurement files, see `ivm_load.load`, None to always parse
+sidecar_dir = os.path.join(startdir, '.ivm_sidecars')
+
+# moved to `numpy.exceptions` in NumPy 1.25, removed from `numpy` in 2.0
+warnings.simplefilter('ignore', getattr(np, 'RankWarning', None) or
+                      np.exceptions.RankWarning)
+
+
+def process_file(dirname, fname, degree, manipulations, method='polyfit',
+                 target=None, ads_form='power', cache_dir=None,
+                 sidecar_dir=None):
+    """
+    Loads, manipulates and fits a single I-V measurement file, and saves a
+    graph of the result next to it.
+
+    Parameters:
+    -----------
+    dirname : str
+        Folder containing the measurement file.
+    fname : str
+        Name of the measurement file.
+    degree : int
+        The degree of polynomial to which the data is to be fitted.
+    manipulations : list of tuples
+        Functions from `iv_manipulate` to apply to the data, in order, as
+        pairs of function name and keyword parameters.
+    method : {'polyfit', 'chebyshev'}, optional
+        Fitting backend, see `elvd_tools.fit_poly`.
+    target : float, optional
+        If given, the lowest degree up to `degree` for which the fit meets
+        this residual is used instead, see `elvd_tools.select_degree`.
+    ads_form : {'power', 'horner'}, optional
+        Form of the polynomial string, see `elvd_tools.poly_to_ads_string`.
+    cache_dir : str, optional
+        Folder holding a `poly_cache` cache. If the file has been fitted with
+        the same parameters before, and its graph exists, the cached
+        polynomial is returned without any processing.
+    sidecar_dir : str, optional
+        Folder holding parsed measurement files, see `ivm_load.load`.
+
+    Returns:
+    --------
+    device_id : str
+        Device identifier, derived from the filename.
+    polynom : str
+        The fitted polynomial, in Agilent/Keysight ADS format.
+
+    Notes:
+    ------
+    Works with absolute paths only, the current working directory is never
+    changed. Safe to run in a separate process. The graph is drawn on a
+    figure shared by all files processed in the same process.
+
+    """
+
+    name, ext = os.path.splitext(fname)
+    name = name.split('_')
+    device_id = ' '.join(name[1:3])
+    plot_title = ' '.join([device_id, 'sample', name[3]])
+
+    # a bit of magic, dependent on filenames following certain pattern
+    plot_fname = '_'.join(name[1:4])
+    plot_fname = '_'.join([plot_fname, 'sym_neg'])
+    plot_fname = '.'.join([plot_fname, 'jpg'])
+    plot_fname = os.path.join(dirname, plot_fname)
+
+    if cache_dir is not None:
+        chain = [(func_name, sorted(kwargs.items())) for
+                 (func_name, kwargs) in manipulations]
+        params = (degree, method, target, ads_form, chain)
+        key = poly_cache.cache_key(os.path.join(dirname, fname), params)
+        cached = poly_cache.load(cache_dir, key)
+        if cached is not None and os.path.exists(plot_fname):
+            fit, coeffs, polynom = cached
+            return (device_id, polynom)
+
+    data = ivm_load.load(os.path.join(dirname, fname), skiprows=1,
+                         sidecar_dir=sidecar_dir)
+    data[:, 1] /= 1e-3  # convert to mA
+
+    # I-V scaling routines, `data` is not needed afterwards
+    pipeline = iv_manipulate.IVPipeline(manipulations)
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always', RuntimeWarning)
+        data = pipeline([data], inplace=True)[0]
+    for warning in caught:  # e.g. unclear region bounds, name the file
+        print(fname, ': ', warning.message, sep='')
+
+    if target is not None:
+        degree = elvd_tools.select_degree(data, target, degree)[0]
+
+    fit, coeffs = elvd_tools.fit_poly(data, degree, method)
+    polynom = elvd_tools.poly_to_ads_string(coeffs, ads_form)
+
+    global _figure
+    plot_columns = elvd_tools.pixel_columns(plot_dpi, _figure)
+    try:  # plot graph, on the figure of the previous file if any
+        _figure = elvd_tools.custom_plot(data=data, xlabel='Voltage, [V]',
+                                         ylabel='Current, [mA]',
+                                         mode='linear', title=plot_title,
+                                         fig=_figure, columns=plot_columns)
+        _figure.savefig(plot_fname, dpi=plot_dpi)
+    except IndexError as e:
+        print(e)
+
+    if cache_dir is not None:
+        poly_cache.store(cache_dir, key, fit, coeffs, polynom)
+
+    return (device_id, polynom)
 
+
+# one figure per process, reused for every file, see `elvd_tools.custom_plot`
+_figure = None
+
+
+def _process_job(job):
+    # unpacks arguments, `Pool.imap` passes a single one
+    return process_file(*job)
+
+
+def process_tree(startdir, degree, manipulations, method='polyfit',
+                 target=None, ads_form='power', workers=1, cache_dir=None,
+                 cache_size=256 * 2**20, selection=None, sidecar_dir=None,
+                 index_fname=None, rebuild_index=False):
+    """
+    Traverses a folder tree and fits a polynomial to every I-V measurement
+    file in it. For each folder, the polynomials are saved in a txt file.
+
+    Parameters:
+    -----------
+    startdir : str
+        Root of the folder tree.
+    degree : int
+        The degree of polynomial to which the data is to be fitted.
+    manipulations : list of tuples
+        Functions from `iv_manipulate` to apply to the data, see
+        `process_file`.
+    method : {'polyfit', 'chebyshev'}, optional
+        Fitting backend, see `elvd_tools.fit_poly`.
+    target : float, optional
+        Residual used to pick the degree of each fit, see `process_file`.
+    ads_form : {'power', 'horner'}, optional
+        Form of the polynomial strings, see `elvd_tools.poly_to_ads_string`.
+    workers : int, optional
+        Number of processes to spread the files over. With 1, all files are
+        processed serially in the current process.
+    cache_dir : str, optional
+        Folder holding a cache of fitted polynomials. Not used if None.
+    cache_size : int, optional
+        Maximum size of the cache, in bytes. Least recently used entries are
+        removed once all files are processed.
+    selection : dict, optional
+        If given, only files whose names match these criteria are processed,
+        see `meta_index.select`, e.g. `{'device': 'L938', 'size': 'D2'}`.
+        The polynomials of these files are then merged into the existing
+        txt files, replacing those of the same devices.
+    sidecar_dir : str, optional
+        Folder holding parsed measurement files, see `ivm_load.load`. Kept
+        apart from `cache_dir`, as the cache size only covers polynomials.
+        Not used if None.
+    index_fname : str, optional
+        File holding the index of measurement files, see `meta_index`. If it
+        exists, the tree is not scanned, so files added or removed since are
+        missed until `rebuild_index` is set. Otherwise, the tree is scanned
+        and the index saved there. The tree is scanned every time if None.
+    rebuild_index : bool, optional
+        If True, the tree is scanned again and `index_fname` replaced.
+
+    Notes:
+    ------
+    Files are processed in sorted order within each folder, so the output
+    files do not depend on the number of workers.
+
+    """
+
+    # get all files with I-V measurements, from their names only
+    index = None
+    if index_fname is not None and not rebuild_index:
+        try:
+            index = meta_index.load_index(index_fname)
+        except (IOError, OSError, ValueError):
+            pass  # missing, or a damaged index
+    if index is None:
+        index = meta_index.build_index(startdir, extensions=('.ivm',))
+        if index_fname is not None:
+            meta_index.save_index(index_fname, index)
+    if selection is not None:
+        index = meta_index.select(index, **selection)
+
+    jobs = [(record['dirname'], record['fname'], degree, manipulations,
+             method, target, ads_form, cache_dir, sidecar_dir) for
+            record in index]
+
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+        try:
+            results = pool.map(_process_job, jobs, chunksize=4)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [_process_job(job) for job in jobs]
+
+    if cache_dir is not None:
+        poly_cache.evict(cache_dir, cache_size)
+
+    # merge per-folder, results come back in job order
+    all_polynoms = collections.OrderedDict()
+    for job, (device_id, polynom) in zip(jobs, results):
+        polynoms = all_polynoms.setdefault(job[0], collections.OrderedDict())
         polynoms[device_id] = polynom
 
-    if polynoms:
-        with open(dirname+'_autopoly_sym_neg2.txt', 'w') as fout:
+    for dirname, polynoms in all_polynoms.items():
+        txt_fname = dirname+'_autopoly_sym_neg2.txt'
+        if selection is not None:  # keep devices not processed this time
+            merged = _read_polynoms(txt_fname)
+            merged.update(polynoms)
+            polynoms = merged
+        with open(txt_fname, 'w') as fout:
             for device, iv in polynoms.items():
                 fout.write(device)
                 fout.write(': \n')
-                fout.write(iv[:-1])
+                fout.write(iv.rstrip('+'))
                 fout.write('\n')
 
-plt.close('all')
+    global _figure
+    plt.close('all')
+    _figure = None
+
+
+def _read_polynoms(txt_fname):
+    """
+    Reads the polynomials saved by `process_tree` for a folder, as an ordered
+    dict of device and polynomial. Empty if there is no such file.
+
+    """
+
+    polynoms = collections.OrderedDict()
+    try:
+        with open(txt_fname, 'r') as fin:
+            lines = [line.rstrip('\n') for line in fin]
+    except IOError:
+        return polynoms
+
+    for device, iv in zip(lines[::2], lines[1::2]):
+        polynoms[device[:-len(': ')]] = iv
+
+    return polynoms
+
+if __name__ == '__main__':
+    process_tree(startdir, degree, manipulations, method, target, ads_form,
+                 workers, cache_dir, cache_size, selection, sidecar_dir,
+                 index_fname, rebuild_index)
@@ -3,6 +3,13 @@ from __future__ import print_function
 import numpy as np
 
 
+m = 0.91e-30  # effective electron mass
+hbar = 1.06e-34  # Planck's constant
+q = 1.6e-19  # Electron charge
+NI = 25000  # number of steps
+mult = np.sqrt(2 * m * q / (hbar**2))
+
+
 def dbtx_calc(fractE, fractC, Lw, Lbe, Lbc):
     """
     A Python translation of a Matlab script to calculate electron transmission
@@ -73,10 +80,201 @@ def dbtx_calc(fractE, fractC, Lw, Lbe, Lbc):
     Lbe *= 1e-10
     Lbc *= 1e-10
 
-    m = 0.91e-30  # effective electron mass
-    hbar = 1.06e-34  # Planck's constant
-    q = 1.6e-19  # Electron charge
-    NI = 25000  # number of steps
+    Vbc = (80*fractC) / 100
+    de = (Vbc - 0.001) / NI
+
+    E = np.arange(1, NI + 1) * de  # whole energy grid at once
+
+    Tx = _transmission(E, fractE, fractC, Lw, Lbe, Lbc)
+
+    E = np.abs(E)
+    Tx = np.abs(Tx)
+
+    return np.array([E, Tx])  # combined in a numpy array
+
+
+def dbtx_sweep(fractE, fractC, Lw, Lbe, Lbc, mesh=False,
+               max_elements=2**15):
+    """
+    Calculates the transmission probability for many GaAs/AlGaAs RTD layer
+    structures at once. Same physics as `dbtx_calc`, but all structures are
+    evaluated with broadcasting instead of one call per structure.
+
+    Parameters:
+    -----------
+    fractE, fractC : array_like
+        Mole fractions of Aluminium in emitter and collector barriers.
+    Lw, Lbe, Lbc : array_like
+        Well, emitter barrier and collector barrier lengths in Angstroms.
+    mesh : bool, optional
+        If True, the full grid of all parameter combinations is calculated,
+        with one axis per parameter. Otherwise the parameters are broadcast
+        against each other, e.g. as returned by `numpy.meshgrid`.
+    max_elements : int, optional
+        Maximum number of energy levels, over all structures, evaluated in
+        one pass. Keeps the temporaries small enough to stay in cache, which
+        matters more than the little work structures share; at least one
+        structure is always evaluated per pass, i.e. one at a time with the
+        default and `NI` levels per structure.
+
+    Returns:
+    --------
+    E : numpy.ndarray
+        Electron energy levels for each structure.
+    Tx : numpy.ndarray
+        Transmission probability for each structure as function of electron
+        energy.
+
+    Notes:
+    ------
+    Output is returned as a NumPy array of shape ``(2,) + shape + (NI,)``,
+    where `shape` is the broadcast shape of the parameters. As in
+    `dbtx_calc`, each structure has its own energy grid, from 0 up to the
+    collector barrier height.
+
+    Example:
+    --------
+    >>> import numpy as np
+    >>> import dbrttx
+    >>> results = dbrttx.dbtx_sweep(fractE=1.0, fractC=1.0,
+                                    Lw=np.arange(40, 61, 5), Lbe=17, Lbc=17)
+    >>> E, Tx = results
+    >>> Tx.shape
+    (5, 25000)
+
+    """
+
+    params = [fractE, fractC, Lw, Lbe, Lbc]
+    params = [np.asarray(param, dtype=float).ravel() if mesh else
+              np.asarray(param, dtype=float) for param in params]
+
+    if mesh:
+        params = np.meshgrid(*params, indexing='ij')
+
+    params = np.broadcast_arrays(*params)
+    shape = params[0].shape
+    fractE, fractC, Lw, Lbe, Lbc = [param.ravel() for param in params]
+
+    # convert to SI units
+    Lw = Lw * 1e-10
+    Lbe = Lbe * 1e-10
+    Lbc = Lbc * 1e-10
+
+    Vbc = (80*fractC) / 100
+    de = (Vbc - 0.001) / NI
+    steps = np.arange(1, NI + 1)  # shared by all structures
+
+    results = np.empty((2, fractE.size, NI))
+    chunk_size = max(int(max_elements) // NI, 1)  # structures per pass
+
+    for start in range(0, fractE.size, chunk_size):
+        chunk = slice(start, start + chunk_size)
+        E = steps * de[chunk, np.newaxis]
+
+        Tx = _transmission(E, fractE[chunk, np.newaxis],
+                           fractC[chunk, np.newaxis], Lw[chunk, np.newaxis],
+                           Lbe[chunk, np.newaxis], Lbc[chunk, np.newaxis])
+
+        results[0, chunk] = np.abs(E)
+        results[1, chunk] = np.abs(Tx)
+
+    return results.reshape((2,) + shape + (NI,))
+
+
+def dbtx_adaptive(fractE, fractC, Lw, Lbe, Lbc, n_start=500, tol=1e-3,
+                  min_width=1e-9, max_iter=40):
+    """
+    Calculates the transmission probability of a GaAs/AlGaAs RTD on an
+    adaptive, non-uniform, energy grid. Starts from a coarse uniform grid,
+    finds the resonance peaks in `Tx` and only refines the grid around them,
+    until the transmission is resolved to within a given tolerance.
+
+    Parameters:
+    -----------
+    fractE, fractC : float
+        Mole fractions of Aluminium in emitter and collector barriers.
+    Lw, Lbe, Lbc : float
+        Well, emitter barrier and collector barrier lengths in Angstroms.
+    n_start : int, optional
+        Number of points in the initial uniform grid. Must be fine enough for
+        every resonance to show up as a local maximum.
+    tol : float, optional
+        Tolerance on `log10(Tx)`. An interval is split as long as the
+        transmission at its midpoint differs from the (logarithmic)
+        interpolation between its ends by more than `tol`.
+    min_width : float, optional
+        Intervals narrower than this, in eV, are never split.
+    max_iter : int, optional
+        Maximum number of refinement passes.
+
+    Returns:
+    --------
+    E : array_like
+        Electron energy levels, non-uniformly spaced, sorted.
+    Tx : array_like
+        Transmission probabilty as function of electron energy.
+
+    Notes:
+    ------
+    Output is returned as a NumPy array, with E and Tx being two rows in it,
+    same as `dbtx_calc`. Energy range is the same as for `dbtx_calc`.
+
+    """
+
+    fractE = float(fractE)
+    fractC = float(fractC)
+    Lw = float(Lw) * 1e-10
+    Lbe = float(Lbe) * 1e-10
+    Lbc = float(Lbc) * 1e-10
+
+    Vbc = (80*fractC) / 100
+    E_max = Vbc - 0.001
+    E = np.linspace(E_max / NI, E_max, int(n_start))
+    Tx = np.abs(_transmission(E, fractE, fractC, Lw, Lbe, Lbc))
+
+    # intervals whose midpoint has already been checked against `tol`
+    settled = np.zeros(E.size - 1, dtype=bool)
+
+    for _ in range(max_iter):
+        # resonance peaks, as local maxima of Tx
+        peaks = np.where((Tx[1:-1] > Tx[:-2]) & (Tx[1:-1] >= Tx[2:]))[0] + 1
+        near_peak = np.zeros(E.size - 1, dtype=bool)
+        near_peak[peaks - 1] = True
+        near_peak[peaks] = True
+
+        split = near_peak & ~settled & (np.diff(E) > min_width)
+        split = np.where(split)[0]
+        if split.size == 0:
+            break
+
+        E_mid = (E[split] + E[split + 1]) / 2
+        Tx_mid = np.abs(_transmission(E_mid, fractE, fractC, Lw, Lbe, Lbc))
+
+        # compare against logarithmic interpolation, Tx spans decades
+        log_interp = (np.log10(Tx[split]) + np.log10(Tx[split + 1])) / 2
+        done = ~(np.abs(np.log10(Tx_mid) - log_interp) > tol)
+
+        E = np.insert(E, split + 1, E_mid)
+        Tx = np.insert(Tx, split + 1, Tx_mid)
+
+        # both halves of a split interval inherit its result
+        settled = np.insert(settled, split + 1, done)
+        first_half = split + np.arange(split.size)
+        settled[first_half] = done
+
+    return np.array([E, Tx])  # combined in a numpy array
+
+
+def _transmission(E, fractE, fractC, Lw, Lbe, Lbc):
+    """
+    Array-based core of `dbtx_calc`. Evaluates the wavevectors, the N, O, P
+    and Q matrix elements and T11 for every energy in `E` in a single pass.
+
+    Lengths are in metres. All of `E`, `fractE`, `fractC`, `Lw`, `Lbe` and
+    `Lbc` may be arrays, as long as they broadcast against each other.
+
+    """
+
     Mw = 0.067
     Me = Mw
     Mc = Mw
@@ -84,53 +282,39 @@ def dbtx_calc(fractE, fractC, Lw, Lbe, Lbc):
     Mbc = (0.083*fractC + 0.067)
     Vbe = (80*fractE) / 100
     Vbc = (80*fractC) / 100
-    de = (Vbc - 0.001) / NI
     Ve = 0
     Vw = 0
     Vc = 0
 
-    # initialise empty lists
-    Tx = list()
-    E = list()
-
-    for n in range(NI):
-        E.append((n + 1) * de)
-        mult = np.sqrt(2 * m * q / (hbar**2))
-
-        ke = mult * np.sqrt(Me * (E[n] - Ve))
-        kbe = mult * np.sqrt(Mbe * (Vbe - E[n]))
-        kw = mult * np.sqrt(Mw * (E[n] - Vw))
-        kbc = mult * np.sqrt(Mbc * (Vbc - E[n]))
-        kc = mult * np.sqrt(Mc * (E[n] - Vc))
-
-        a = (kbe * Me) / (ke * Mbe)
-        b = (kw * Mbe) / (kbe * Mw)
-        c = (kbc * Mw) / (kw * Mbc)
-        d = (kc * Mbc) / (kbc * Mc)
-
-        e = complex(0, kw*Lw)
-        N11 = complex(1, a)
-        N12 = complex(1, -a)
-        O11 = complex(1, -b) * np.exp(kbe * Lbe)
-        O12 = complex(1, +b) * np.exp(kbe * Lbe)
-        O21 = complex(1, +b) * np.exp(-kbe * Lbe)
-        O22 = complex(1, -b) * np.exp(-kbe * Lbe)
-        P11 = complex(1, +c) * np.exp(-e)
-        P12 = complex(1, -c) * np.exp(-e)
-        P21 = complex(1, -c) * np.exp(e)
-        P22 = complex(1, +c) * np.exp(e)
-        Q11 = complex(1, -d) * np.exp(kbc * Lbc)
-        Q21 = complex(1, +d) * np.exp(-kbc * Lbc)
-
-        T11 = (N11*O11 + N12*O21) * (P11*Q11 + P12*Q21) + \
-            (N11*O12 + N12*O22) * (P21*Q11 + P22*Q21)
-
-        Tx.append(16 * kc / (ke * (T11 * np.conj(T11))))
+    ke = mult * np.sqrt(Me * (E - Ve))
+    kbe = mult * np.sqrt(Mbe * (Vbe - E))
+    kw = mult * np.sqrt(Mw * (E - Vw))
+    kbc = mult * np.sqrt(Mbc * (Vbc - E))
+    kc = mult * np.sqrt(Mc * (E - Vc))
 
-    E = np.abs(E)
-    Tx = np.abs(Tx)
+    a = (kbe * Me) / (ke * Mbe)
+    b = (kw * Mbe) / (kbe * Mw)
+    c = (kbc * Mw) / (kw * Mbc)
+    d = (kc * Mbc) / (kbc * Mc)
 
-    return np.array([E, Tx])  # combined in a numpy array
+    # N.O and P.Q folded into two products each, in terms of cosh and sinh
+    # of the barrier exponents, to keep the number of temporaries low
+    ab = a * b
+    cd = c * d
+    cosh_be = np.cosh(kbe * Lbe)
+    sinh_be = np.sinh(kbe * Lbe)
+    cosh_bc = np.cosh(kbc * Lbc)
+    sinh_bc = np.sinh(kbc * Lbc)
+    exp_w = np.exp(1j * kw * Lw)
+
+    NO1 = (1 + ab)*cosh_be + 1j*(a - b)*sinh_be
+    NO2 = (1 - ab)*cosh_be + 1j*(a + b)*sinh_be
+    PQ1 = ((1 + cd)*cosh_bc + 1j*(c - d)*sinh_bc) / exp_w
+    PQ2 = ((1 - cd)*cosh_bc - 1j*(c + d)*sinh_bc) * exp_w
+
+    T11 = 4 * (NO1*PQ1 + NO2*PQ2)
+
+    return 16 * kc / (ke * (T11 * np.conj(T11)))
 
 if __name__ == '__main__':
     print(dbtx_calc.__doc__)
@@ -4,10 +4,16 @@ A module to hold all auxiliary, all-purpose, functions.
 
 Functions contained in module.
 ------------------------------
-- fit_poly(data, degree)
-- poly_to_ads_string(coeffs)
+- fit_poly(data, degree, method='polyfit')
+- fit_poly_batch(data, degree, method='polyfit')
+- select_degree(data, target, max_degree=60, holdout=5)
+- poly_to_ads_string(coeffs, form='power', tol=0.0, v_max=1.0)
+- apply_style(force=False)
+- style_axes(ax)
+- decimate(data, columns)
+- pixel_columns(dpi, fig=None)
 - custom_plot(data, xlabel='X axis', ylabel='Y axis', title='Plot title',
-              legend=None, mode='linear')
+              legend=None, mode='linear', fig=None, columns=None)
 
 Individual documentation can be accessed by using the following commands:
 >>> import elvd_tools
@@ -24,7 +30,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 
 
-def fit_poly(data, degree):
+def fit_poly(data, degree, method='polyfit'):
     """
     Fits an array of [x, y] data to a polynomial of a specified
     degree. Used with measured I-V data.
@@ -35,22 +41,59 @@ def fit_poly(data, degree):
         I-V data of one device.
     degree : int
         The degree of polynomial to which the data is to be fitted.
+    method : {'polyfit', 'chebyshev'}, optional
+        Fitting backend. 'polyfit' solves for the polynomial coefficients
+        directly, using `numpy.polyfit`. 'chebyshev' fits a Chebyshev series
+        on the `x` range mapped to [-1, 1], using a QR-based least squares
+        solve, and converts the result to ordinary coefficients, see Notes.
 
     Returns:
     --------
     fit : numpy.ndarray
-        The original x data, bundled with the fitted y data.
+        The original x data, bundled with the fitted y data, evaluated from
+        `coeffs`.
     coeffs : numpy.ndarray
         The coefficients of the fitted polynomial, highest order first.
 
+    Raises:
+    -------
+    ValueError
+        In case an invalid parameter is specified for the `method` variable.
+
     Notes:
     ------
     Requires an installation of NumPy.
+    The Chebyshev series itself is well conditioned, but converting it to
+    ordinary coefficients loses accuracy quickly with degree, as the
+    coefficients of high order Chebyshev polynomials are huge and cancel.
+    Above degree 40 for `x` symmetric around 0, down to degree 14 if the `x`
+    range does not contain 0, the conversion is not accurate enough, and
+    `numpy.polyfit` is used instead. Below that, 'chebyshev' is two to three
+    times faster than 'polyfit', for the same accuracy. Should a converted
+    fit still differ from the series by more than the residual of the fit,
+    `numpy.polyfit` is used as well, and the coefficients closer to the data
+    are returned.
+    If the `x` range contains 0, it is mapped to [-1, 1] by scaling only,
+    which makes the conversion cheap.
 
     """
 
-    coeffs = np.polyfit(data[:, 0], data[:, 1], degree)
-    fit = np.polyval(coeffs, data[:, 0])
+    if method not in ('polyfit', 'chebyshev'):
+        raise ValueError('Method should be either polyfit or chebyshev')
+
+    if method == 'chebyshev' and degree > _max_converted_degree(data[:, 0]):
+        method = 'polyfit'  # conversion would fail, see Notes
+
+    if method == 'polyfit':
+        coeffs = np.polyfit(data[:, 0], data[:, 1], degree)
+        fit = np.polyval(coeffs, data[:, 0])
+    else:
+        cheb_coeffs, domain, cheb_fit = _fit_chebyshev(data[:, 0],
+                                                       data[:, 1], degree)
+        coeffs = _checked_poly(data[:, 0], data[:, 1], cheb_coeffs, domain,
+                               cheb_fit)
+        fit = np.polyval(coeffs, data[:, 0])
+
     # combine original data and fit into a single array
     fit = np.array([data[:, 0], fit])
     fit = fit.T
@@ -58,7 +101,323 @@ def fit_poly(data, degree):
     return (fit, coeffs)
 
 
-def poly_to_ads_string(coeffs):
+def fit_poly_batch(data, degree, method='polyfit'):
+    """
+    Fits the I-V data of many devices to polynomials of a specified degree.
+    Devices measured on the same voltage grid are fitted together, with a
+    single least squares solve for all of them.
+
+    Parameters:
+    -----------
+    data : list of numpy.ndarray or numpy.ndarray
+        I-V data of each device, one [x, y] array per device, or a stack of
+        such arrays.
+    degree : int
+        The degree of polynomial to which the data is to be fitted.
+    method : {'polyfit', 'chebyshev'}, optional
+        Fitting backend, see `fit_poly`.
+
+    Returns:
+    --------
+    fits : list of numpy.ndarray
+        For each device, the original x data, bundled with the fitted y data.
+    coeffs : numpy.ndarray
+        The coefficients of the fitted polynomials, one row per device,
+        highest order first.
+
+    Raises:
+    -------
+    ValueError
+        In case an invalid parameter is specified for the `method` variable.
+
+    Notes:
+    ------
+    Requires an installation of NumPy.
+    Results are the same as calling `fit_poly` for each device. Devices whose
+    voltage grid is not shared with any other are still fitted one at a time.
+
+    Example:
+    --------
+    >>> import numpy as np
+    >>> import elvd_tools
+    >>> volts = np.linspace(-1, 1, 201)
+    >>> data = [np.array([volts, np.sin(k * volts)]).T for k in (2, 3, 4)]
+    >>> fits, coeffs = elvd_tools.fit_poly_batch(data, 9, 'chebyshev')
+    >>> coeffs.shape
+    (3, 10)
+
+    """
+
+    if method not in ('polyfit', 'chebyshev'):
+        raise ValueError('Method should be either polyfit or chebyshev')
+
+    # group devices by voltage grid
+    groups = dict()
+    for index, datum in enumerate(data):
+        x = np.ascontiguousarray(datum[:, 0])
+        groups.setdefault((x.shape, x.tobytes()), list()).append(index)
+
+    fits = [None] * len(data)
+    coeffs = np.zeros((len(data), degree + 1))
+
+    for indices in groups.values():
+        x = data[indices[0]][:, 0]
+        y = np.array([data[index][:, 1] for index in indices]).T
+
+        if method == 'polyfit' or degree > _max_converted_degree(x):
+            group_coeffs = np.polyfit(x, y, degree)
+            group_fit = np.dot(np.vander(x, degree + 1), group_coeffs)
+        else:
+            cheb_coeffs, domain, group_fit = _fit_chebyshev(x, y, degree)
+            group_coeffs = _checked_poly(x, y, cheb_coeffs, domain,
+                                         group_fit)
+            group_fit = np.dot(np.vander(x, degree + 1), group_coeffs)
+
+        for column, index in enumerate(indices):
+            fits[index] = np.array([x, group_fit[:, column]]).T
+            coeffs[index] = group_coeffs[:, column]
+
+    return (fits, coeffs)
+
+
+def select_degree(data, target, max_degree=60, holdout=5):
+    """
+    Finds the lowest polynomial degree that describes the data to within a
+    target residual. The residual is measured on datapoints that are held out
+    of the fit, so a degree is not chosen just because it fits the noise.
+
+    Parameters:
+    -----------
+    data : numpy.ndarray
+        I-V data of one device.
+    target : float
+        Target root-mean-square residual, in the units of the `y` data.
+    max_degree : int, optional
+        Highest degree considered.
+    holdout : int, optional
+        Every `holdout`-th datapoint is held out of the fit, and used to
+        measure the residual.
+
+    Returns:
+    --------
+    degree : int
+        The lowest degree meeting `target`. If none does, the degree with the
+        smallest residual.
+    errors : numpy.ndarray
+        The held-out residual for every degree from 0 to `max_degree`. Inf
+        for degrees higher than the number of fitted datapoints allows.
+
+    Notes:
+    ------
+    Requires an installation of NumPy.
+    All degrees are fitted using a single factorisation of the Chebyshev
+    Vandermonde matrix for `max_degree`, see `fit_poly`. Its `R` factor and
+    the projected data for lower degrees are just the leading blocks of those
+    for `max_degree`, so each extra degree costs a small triangular solve.
+
+    Example:
+    --------
+    >>> import numpy as np
+    >>> import elvd_tools
+    >>> volts = np.linspace(-1, 1, 501)
+    >>> data = np.array([volts, volts**3 - volts]).T
+    >>> degree, errors = elvd_tools.select_degree(data, target=1e-9)
+    >>> print(degree)
+    3
+
+    """
+
+    x = data[:, 0]
+    held_out = np.zeros(len(x), dtype=bool)
+    held_out[holdout - 1::holdout] = True
+
+    # a degree needs more fitted datapoints than coefficients
+    fit_degree = min(max_degree, np.count_nonzero(~held_out) - 1)
+    if fit_degree < 0:
+        raise ValueError('Too few datapoints to fit')
+
+    t = _chebyshev_domain(x)[1]
+    vander = np.polynomial.chebyshev.chebvander(t, fit_degree)
+
+    r = _qr_r(vander[~held_out])
+    projected = np.linalg.solve(r.T, np.dot(vander[~held_out].T,
+                                            data[~held_out, 1]))
+
+    errors = np.empty(max_degree + 1)
+    errors.fill(np.inf)
+    for degree in range(fit_degree + 1):
+        cheb_coeffs = np.linalg.solve(r[:degree + 1, :degree + 1],
+                                      projected[:degree + 1])
+        residual = (np.dot(vander[held_out, :degree + 1], cheb_coeffs) -
+                    data[held_out, 1])
+        errors[degree] = np.sqrt(np.mean(residual**2))
+
+    meets_target = np.where(errors <= target)[0]
+    if meets_target.size:
+        degree = meets_target[0]
+    else:
+        degree = np.argmin(errors)
+
+    return (int(degree), errors)
+
+
+def _fit_chebyshev(x, y, degree):
+    """
+    Least squares fit of a Chebyshev series to `y`, over the `x` range mapped
+    to [-1, 1]. `y` can have one column per dataset.
+
+    Returns the series coefficients, lowest order first, the domain, and the
+    fitted `y` data. With no more datapoints than coefficients, returns the
+    minimum norm solution instead, as `numpy.polyfit` does.
+
+    """
+
+    domain, t = _chebyshev_domain(x)
+    vander = np.polynomial.chebyshev.chebvander(t, degree)
+
+    if len(x) <= degree:  # `R` would not be square
+        cheb_coeffs = np.linalg.lstsq(vander, y, rcond=None)[0]
+    else:
+        r = _qr_r(vander)
+        # semi-normal equations, R^T R c = V^T y, two triangular solves
+        cheb_coeffs = np.linalg.solve(r.T, np.dot(vander.T, y))
+        cheb_coeffs = np.linalg.solve(r, cheb_coeffs)
+
+    return (cheb_coeffs, domain, np.dot(vander, cheb_coeffs))
+
+
+def _chebyshev_domain(x):
+    """
+    Domain of a Chebyshev series for `x`, and `x` mapped to it. The domain
+    is centred on 0 if it contains 0, so it is mapped to [-1, 1] by scaling
+    alone, otherwise it is the range of `x`.
+
+    """
+
+    domain = np.array([np.min(x), np.max(x)])
+    if domain[0] <= 0.0 <= domain[1]:
+        half_width = np.max(np.abs(domain))
+        domain = np.array([-half_width, half_width])
+    t = (2*x - domain.sum()) / (domain[1] - domain[0])
+
+    return (domain, t)
+
+
+def _max_converted_degree(x):
+    """
+    Highest degree whose Chebyshev series `_chebyshev_to_poly` converts
+    accurately, for data over `x`. 40 if `x` is symmetric around 0, down to
+    14 if it does not contain 0, as found on sweeps of smooth, noisy, data.
+
+    """
+
+    x_min, x_max = np.min(x), np.max(x)
+    coverage = 0.0  # how much of the series domain is used on both sides
+    if x_min <= 0.0 <= x_max and x_max > x_min:
+        coverage = min(-x_min, x_max) / max(-x_min, x_max)
+
+    return int(14 + 26 * coverage)
+
+
+def _checked_poly(x, y, cheb_coeffs, domain, cheb_fit):
+    """
+    Ordinary coefficients of a fitted Chebyshev series, see `fit_poly`. Where
+    the converted coefficients do not reproduce the series to within the
+    residual of the fit, those of `numpy.polyfit` are used instead, if they
+    are closer to the data. `y` can have one column per dataset.
+
+    """
+
+    coeffs = _chebyshev_to_poly(cheb_coeffs, domain)
+    vander = np.vander(x, len(coeffs))
+
+    # worst error of conversion, against the rms residual of the fit
+    conversion_error = np.max(np.abs(np.dot(vander, coeffs) - cheb_fit),
+                              axis=0)
+    tolerance = np.maximum(np.sqrt(np.mean((cheb_fit - y)**2, axis=0)),
+                           1e-12 * np.max(np.abs(y), axis=0))
+    inaccurate = np.atleast_1d(conversion_error > tolerance)
+    if not inaccurate.any():
+        return coeffs
+
+    polyfit_coeffs = np.polyfit(x, y, len(coeffs) - 1)
+    error = np.max(np.abs(np.dot(vander, coeffs) - y), axis=0)
+    polyfit_error = np.max(np.abs(np.dot(vander, polyfit_coeffs) - y),
+                           axis=0)
+    better = polyfit_error < error
+
+    if coeffs.ndim == 1:
+        return polyfit_coeffs if better else coeffs
+    coeffs[:, better] = polyfit_coeffs[:, better]
+
+    return coeffs
+
+
+def _qr_r(vander):
+    """
+    `R` factor of the thin QR factorisation of a (well conditioned)
+    Vandermonde matrix. Uses Cholesky QR, which only needs the small Gram
+    matrix and is several times faster than Householder QR for tall
+    matrices. Falls back to `numpy.linalg.qr` if the matrix turns out to be
+    too badly conditioned.
+
+    """
+
+    try:
+        r = np.linalg.cholesky(np.dot(vander.T, vander)).T
+    except np.linalg.LinAlgError:
+        r = np.linalg.qr(vander, mode='r')
+
+    return r
+
+
+def _chebyshev_to_poly(cheb_coeffs, domain):
+    """
+    Ordinary coefficients in `x` of a Chebyshev series over `domain`, highest
+    order first, same as `numpy.polyfit`. `cheb_coeffs` can have one column
+    per dataset. Not accurate at high degrees, see `_checked_poly`.
+
+    """
+
+    degree = len(cheb_coeffs) - 1
+
+    if domain[0] == -domain[1]:
+        # domain is only scaled, a matrix product and a rescale suffice
+        if degree not in _cheb_to_poly_matrices:
+            _cheb_to_poly_matrices[degree] = _cheb_to_poly_matrix(degree)
+        coeffs = np.dot(_cheb_to_poly_matrices[degree], cheb_coeffs)
+        scale = domain[1] ** np.arange(degree + 1)
+        coeffs = (coeffs.T / scale).T
+    else:
+        coeffs = np.zeros(np.shape(cheb_coeffs))
+        for column in np.ndindex(coeffs.shape[1:]):
+            index = (slice(None),) + column
+            series = np.polynomial.Chebyshev(cheb_coeffs[index], domain)
+            series = series.convert(kind=np.polynomial.Polynomial).coef
+            coeffs[:series.size][index] = series
+
+    return coeffs[::-1]
+
+
+def _cheb_to_poly_matrix(degree):
+    # monomial coefficients of T_n, one column per order, from the recurrence
+    # T_n(x) = 2*x*T_n-1(x) - T_n-2(x)
+    matrix = np.zeros((degree + 1, degree + 1))
+    matrix[0, 0] = 1
+    if degree > 0:
+        matrix[1, 1] = 1
+    for n in range(2, degree + 1):
+        matrix[1:, n] = 2 * matrix[:-1, n - 1]
+        matrix[:, n] -= matrix[:, n - 2]
+
+    return matrix
+
+
+# cached results of `_cheb_to_poly_matrix`, by degree
+_cheb_to_poly_matrices = dict()
+
+
+def poly_to_ads_string(coeffs, form='power', tol=0.0, v_max=1.0):
     """
     Converts the numerical representation of a polynomial to a string one, to
     be used in Agilent/Keysight ADS as an SDD element.
@@ -66,7 +425,16 @@ def poly_to_ads_string(coeffs):
     Parameters:
     -----------
     coeffs : numpy.ndarray
-        Coefficients of the polynomial to be converted.
+        Coefficients of the polynomial to be converted, highest order first.
+    form : {'power', 'horner'}, optional
+        'power' writes out every term as a coefficient times a power of the
+        voltage. 'horner' writes the polynomial in nested form, which needs
+        one multiplication and one addition per term, and no powers.
+    tol : float, optional
+        Terms that never contribute more than `tol` to the current, for
+        voltages up to `v_max` in magnitude, are left out.
+    v_max : float, optional
+        Largest voltage magnitude the SDD element is used at.
 
     Returns:
     --------
@@ -74,18 +442,188 @@ def poly_to_ads_string(coeffs):
         The string representation of the polynomial, to be used as the
         non-linear relationship between I and V in a 2-port SDD element.
 
+    Raises:
+    -------
+    ValueError
+        In case an invalid parameter is specified for the `form` variable.
+
+    Notes:
+    ------
+    For backwards compatibility, 'power' form strings end with a trailing
+    `+`, which is up to the calling function to remove. 'horner' form
+    strings do not.
+
+    Example:
+    --------
+    >>> import elvd_tools
+    >>> print(elvd_tools.poly_to_ads_string([2.0, 0.0, 1.0], form='horner'))
+    (1.000000e+00)+(_v1+_v2)*((_v1+_v2)*((2.000000e+00)))
+
     """
 
-    coeffs = coeffs[::-1]
-    # convert to Agilent ADS SDD format
-    polynom = ['(%e)*((_v1+_v2)^%d)+' % (j, i) for (i, j) in enumerate(coeffs)]
-    polynom = ''.join(polynom)
+    coeffs = np.array(coeffs, dtype=float)[::-1]
+    # drop terms that are negligible over the whole voltage range
+    orders = np.arange(coeffs.size)
+    coeffs[np.abs(coeffs) * float(v_max)**orders <= tol] = 0.0
+
+    if form == 'power':
+        # convert to Agilent ADS SDD format
+        polynom = ['(%e)*((_v1+_v2)^%d)+' % (j, i) for (i, j) in
+                   enumerate(coeffs) if j != 0.0 or tol == 0.0]
+        polynom = ''.join(polynom)
+    elif form == 'horner':
+        nonzero = np.where(coeffs != 0.0)[0]
+        if nonzero.size == 0:
+            return '(0)'
+        # innermost level first, c_n, then c_n-1 + v*(...) and so on
+        polynom = '(%e)' % coeffs[nonzero[-1]]
+        for coeff in coeffs[nonzero[-1] - 1::-1]:
+            polynom = '(_v1+_v2)*(%s)' % polynom
+            if coeff != 0.0:
+                polynom = '(%e)+%s' % (coeff, polynom)
+    else:
+        raise ValueError('Form should be either power or horner')
 
     return polynom
 
 
+# house style of all graphs, see `apply_style`
+house_style = {'font.family': 'serif',
+               'legend.fontsize': 12,
+               'axes.titlesize': 14,
+               'axes.labelsize': 12,
+               'xtick.labelsize': 12,
+               'ytick.labelsize': 12}
+
+# different colours for the different datasets, in order
+line_colours = ['r', 'k', 'b', 'g', 'c', 'm']
+
+_style_applied = False  # set once `house_style` is in use
+
+
+def apply_style(force=False):
+    """
+    Sets the matplotlib parameters of the house style, `house_style`. Only
+    does so the first time it is called, unless `force` is True.
+
+    Notes:
+    ------
+    Affects all figures created afterwards, in the current process.
+
+    """
+
+    global _style_applied
+    if force or not _style_applied:
+        plt.rcParams.update(house_style)
+        _style_applied = True
+
+
+def style_axes(ax):
+    """
+    Applies the house style to the grid, ticks and spines of a set of axes.
+
+    Parameters:
+    -----------
+    ax : matplotlib.axes.Axes
+        The axes to style, usually newly created.
+
+    """
+
+    ax.set_axisbelow(True)
+    ax.grid(which='both', axis='both', color='0.1', ls=':', lw=0.2)
+    ax.tick_params(direction='out', top='off', right='off', width=0.5)
+
+    for spine in ['left', 'top', 'right', 'bottom']:
+        ax.spines[spine].set_linewidth(0.5)
+
+
+def decimate(data, columns):
+    """
+    Reduces a dataset to the points needed to draw it at a given resolution,
+    keeping its shape. Datapoints must be in rows.
+
+    Parameters:
+    -----------
+    data : numpy.ndarray
+        The dataset, X and Y in the first two columns.
+    columns : int
+        Number of pixel columns the dataset is drawn over, see
+        `pixel_columns`.
+
+    Returns:
+    --------
+    data : numpy.ndarray
+        The datapoints kept, in their original order. `data` itself if it
+        has no more than four points per column, or per run, see Notes.
+
+    Notes:
+    ------
+    The range of X is split into `columns` equal buckets, one per pixel
+    column, and the dataset into runs of consecutive points in the same
+    bucket. Of each run, only the first and last points, and those with the
+    lowest and highest Y, are kept, so the line drawn through them covers the
+    same pixels as the full dataset, however X is spaced. For sweeps with
+    increasing or decreasing X, there is one run per bucket. Points with NaN
+    X each form a run of their own, and NaN values of Y are never picked as
+    lowest or highest.
+
+    """
+
+    data = np.asarray(data)
+    num_points = np.size(data, 0)
+    if num_points <= 4 * columns:
+        return data
+
+    x = data[:, 0]
+    y = data[:, 1]
+
+    # pixel column of each point, -1 for NaN
+    buckets = np.full(num_points, -1, dtype=np.intp)
+    finite = ~np.isnan(x)
+    if np.any(finite):
+        x_min = np.min(x[finite])
+        x_span = np.max(x[finite]) - x_min
+        if x_span > 0:
+            buckets[finite] = np.minimum(
+                np.floor((x[finite] - x_min) / x_span * columns),
+                columns - 1)
+        else:
+            buckets[finite] = 0
+
+    changes = (buckets[1:] != buckets[:-1]) | (buckets[1:] == -1)
+    starts = np.concatenate([[0], np.flatnonzero(changes) + 1])
+    ends = np.append(starts[1:] - 1, num_points - 1)
+    if np.size(starts) >= num_points / 4.0:
+        return data  # too many runs to gain anything
+
+    # first point of each run at its lowest and highest Y, NaN ignored
+    run_of = np.repeat(np.arange(np.size(starts)), np.diff(np.append(
+        starts, num_points)))
+    keep = [starts, ends]
+    for reduce_func in (np.fmin, np.fmax):
+        extremes = reduce_func.reduceat(y, starts)
+        hits = np.flatnonzero(y == extremes[run_of])
+        keep.append(hits[np.unique(run_of[hits], return_index=True)[1]])
+
+    return data[np.unique(np.concatenate(keep))]
+
+
+def pixel_columns(dpi, fig=None):
+    """
+    Number of pixel columns across a figure, when saved at `dpi`. Uses the
+    default figure size if `fig` is None.
+
+    """
+
+    if fig is None:
+        width = plt.rcParams['figure.figsize'][0]
+    else:
+        width = fig.get_figwidth()
+    return int(np.ceil(width * dpi))
+
+
 def custom_plot(data, xlabel='X axis', ylabel='Y axis', title='Plot title',
-                legend=None, mode='linear'):
+                legend=None, mode='linear', fig=None, columns=None):
     """
     Plots data, with labels, title, and legend. Used to make sure all graphs
     have the same style. Datapoints must be in columns.
@@ -103,12 +641,20 @@ def custom_plot(data, xlabel='X axis', ylabel='Y axis', title='Plot title',
         The lalbes for the different sets of data, to appear in the legend box.
     mode : {'linear', 'log'}, optional
         Scaling of the Y axis.
+    fig : matplotlib.figure.Figure, optional
+        A figure previously returned by this function. If given, it is reused:
+        the lines already in it are given the new data, and only missing
+        lines are created, instead of drawing a new figure from scratch.
+    columns : int, optional
+        If given, each set of data is first reduced to the points needed to
+        draw it over this many pixel columns, see `decimate`. Should be at
+        least the width of the saved image, see `pixel_columns`.
 
     Returns:
     --------
     fig : matplotlib.figure.Figure
         A matplotlib figure, containing the plots of the data passed to the
-        function.
+        function. The same as `fig`, if given.
 
     Raises:
     -------
@@ -122,6 +668,10 @@ def custom_plot(data, xlabel='X axis', ylabel='Y axis', title='Plot title',
     just created and its parameters set. It is up to the calling function to
     display and/or save the figure.
 
+    When plotting many graphs in a row, reusing one figure saves most of the
+    time spent creating and styling them. The figure should then only be
+    closed once all graphs are saved.
+
     Example:
     --------
     >>> import elvd_tools
@@ -142,52 +692,57 @@ def custom_plot(data, xlabel='X axis', ylabel='Y axis', title='Plot title',
 
     """
 
-    fig = plt.figure()
-    ax1 = fig.add_subplot(111)  # just one plot
-    # different colours for the different datasets
-    ax1.set_color_cycle(['r', 'k', 'b', 'g', 'c', 'm'])
-
     if np.ndim(data) == 2:  # one set of data
         if np.size(data, 0) >= np.size(data, 1) and np.size(data, 1) > 1:
-            ax1.plot(data[:, 0], data[:, 1], lw=1.0)
+            datasets = [data]
         else:
             raise IndexError('Incorrect format. Datapoints must be in columns')
     elif np.ndim(data) == 3:  # two or more sets
         if np.size(data, 1) >= np.size(data, 2) and np.size(data, 2) > 1:
-            for datum in data:
-                ax1.plot(datum[:, 0], datum[:, 1], lw=1.0)
+            datasets = data
         else:
             raise IndexError('Incorrect format. Datapoints must be in columns')
     else:
         raise IndexError('Missing data')
 
+    if fig is None:
+        apply_style()
+        fig = plt.figure()
+        ax1 = fig.add_subplot(111)  # just one plot
+        # cosmetic stuff, make it look pretty
+        style_axes(ax1)
+        ax1.axhline(y=0, color='0', lw=0.5)
+        ax1.axvline(x=0, color='0', lw=0.5)
+    else:
+        ax1 = fig.axes[0]
+
+    # swap the data of existing lines, only add or remove the difference
+    lines = [line for line in ax1.get_lines() if line.get_gid() == 'data']
+    for line in lines[len(datasets):]:
+        line.remove()
+    lines = lines[:len(datasets)]
+    for (n, datum) in enumerate(datasets):
+        if columns is not None:
+            datum = decimate(datum, columns)
+        if n < len(lines):
+            lines[n].set_data(datum[:, 0], datum[:, 1])
+        else:
+            lines.extend(ax1.plot(datum[:, 0], datum[:, 1], lw=1.0,
+                                  gid='data',
+                                  color=line_colours[n % len(line_colours)]))
+
     # set labels, title
     ax1.set_yscale(mode)
+    ax1.relim()
+    ax1.autoscale_view()
     ax1.set_xlabel(xlabel)
     ax1.set_ylabel(ylabel)
     ax1.set_title(title)
 
     if legend is not None:
-        ax1.legend(legend, loc='lower left')
-
-    # cosmetic stuff, make it look pretty
-    ax1.set_axisbelow(True)
-    ax1.grid(which='both', axis='both', color='0.1', ls=':', lw=0.2)
-    ax1.tick_params(direction='out', top='off', right='off', width=0.5)
-
-    for spine in ['left', 'top', 'right', 'bottom']:
-        ax1.spines[spine].set_linewidth(0.5)
-
-    plt.axhline(y=0, color='0', lw=0.5)
-    plt.axvline(x=0, color='0', lw=0.5)
-
-    plt.rc('font', family='serif')
-
-    plt.rc('legend', fontsize=12)
-    plt.rc('axes', titlesize=14)
-    plt.rc('axes', labelsize=12)
-    plt.rc('xtick', labelsize=12)
-    plt.rc('ytick', labelsize=12)
+        ax1.legend(lines, legend, loc='lower left')
+    elif ax1.get_legend() is not None:
+        ax1.get_legend().remove()
 
     return fig
 
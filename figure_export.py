@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+A batch, non-interactive counterpart to `untitled1.py`. Re-exports every saved
+figure in a folder to images in a number of formats and resolutions, without
+displaying anything.
+
+Figures saved as `figure_spec` files are drawn again from their data. Older
+figures saved as pickled matplotlib figures are supported as well, but are
+much slower to load.
+
+Each figure is drawn once, then saved in all formats and resolutions. Figures
+are independent of each other, so they are spread over a pool of `workers`
+processes.
+
+Functions contained in module.
+------------------------------
+- export_figure(fname, outputs)
+- export_folder(fig_dir, formats, dpis, out_dir=None, workers=1)
+
+@author: elvd
+"""
+
+from __future__ import print_function
+import os
+import pickle
+import multiprocessing
+import matplotlib
+matplotlib.use('Agg')  # figures are only ever saved, never shown
+import matplotlib.pyplot as plt
+import figure_spec
+import elvd_tools
+
+
+fig_dir = os.getcwd()  # folder holding the saved figures
+out_dir = None  # where images are saved, None for `fig_dir`
+formats = ['jpg']  # any format supported by matplotlib
+dpis = [300]
+workers = multiprocessing.cpu_count()  # processes used, 1 to run serially
+
+
+def export_figure(fname, outputs):
+    """
+    Draws a saved figure, and saves it as one or more images.
+
+    Parameters:
+    -----------
+    fname : str
+        Path of the saved figure, either a figure spec (`.npz`) or a pickled
+        matplotlib figure (`.pickle`).
+    outputs : list of tuples
+        The images to save, as pairs of path and resolution in dpi. The
+        extension of each path sets the format.
+
+    Returns:
+    --------
+    fname : str
+        Path of the saved figure.
+
+    Notes:
+    ------
+    Works with absolute paths only, and closes the figure once saved. Safe to
+    run in a separate process.
+
+    """
+
+    if os.path.splitext(fname)[1] == '.pickle':
+        with open(fname, 'rb') as file_in:
+            fig = pickle.load(file_in)
+    else:
+        # drawn once for all outputs, so only reduce to the highest dpi
+        columns = elvd_tools.pixel_columns(max(dpi for (out_fname, dpi) in
+                                               outputs))
+        fig = figure_spec.draw(*figure_spec.load(fname), columns=columns)
+
+    try:
+        for out_fname, dpi in outputs:
+            fig.savefig(out_fname, dpi=dpi)
+    finally:
+        plt.close(fig)
+
+    return fname
+
+
+def _export_job(job):
+    # unpacks arguments, `Pool.imap_unordered` passes a single one
+    return export_figure(*job)
+
+
+def export_folder(fig_dir, formats, dpis, out_dir=None, workers=1):
+    """
+    Re-exports all saved figures in a folder.
+
+    Parameters:
+    -----------
+    fig_dir : str
+        Folder holding the saved figures, see `export_figure`. Subfolders are
+        not searched.
+    formats : list of str
+        Image formats, as file extensions, e.g. `['png', 'pdf']`.
+    dpis : list of int
+        Resolutions, in dpi.
+    out_dir : str, optional
+        Folder where images are saved, `fig_dir` if None. Created if it does
+        not exist.
+    workers : int, optional
+        Number of processes to spread the figures over. With 1, all figures
+        are exported serially in the current process.
+
+    Returns:
+    --------
+    out_fnames : list of str
+        Paths of all images saved.
+
+    Notes:
+    ------
+    Images are named after the figure. With more than one resolution, the
+    resolution is appended to the name as well, e.g. `fig_600dpi.png`. If a
+    figure is saved both as a spec and as a pickle, only the spec is used.
+
+    """
+
+    if out_dir is None:
+        out_dir = fig_dir
+    out_dir = os.path.abspath(out_dir)
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+
+    # prefer figure specs over pickles of the same figure
+    fnames = dict()
+    for filename in sorted(os.listdir(fig_dir)):
+        name, ext = os.path.splitext(filename)
+        if ext == '.npz' or (ext == '.pickle' and name not in fnames):
+            fnames[name] = os.path.abspath(os.path.join(fig_dir, filename))
+
+    jobs = list()
+    for name in sorted(fnames):
+        outputs = list()
+        for dpi in dpis:
+            out_name = name
+            if len(dpis) > 1:
+                out_name = '%s_%ddpi' % (name, dpi)
+            outputs.extend((os.path.join(out_dir, out_name + '.' + fmt), dpi)
+                           for fmt in formats)
+        jobs.append((fnames[name], outputs))
+
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+        try:
+            for fname in pool.imap_unordered(_export_job, jobs):
+                print('Exported: ', os.path.basename(fname))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for job in jobs:
+            print('Exported: ', os.path.basename(_export_job(job)))
+
+    return [out_fname for (fname, outputs) in jobs for
+            (out_fname, dpi) in outputs]
+
+if __name__ == '__main__':
+    export_folder(fig_dir, formats, dpis, out_dir, workers)
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+A compact, matplotlib-independent format for saved figures, replacing pickled
+`Figure` objects. A figure spec is a single `.npz` file, holding the plotted
+data arrays plus a small JSON record of the labels and style, from which the
+figure can be drawn again at any time.
+
+Specs are written by `sim_data_graph`, and can be edited before re-rendering,
+e.g. to change a title or legend, by loading them with `load` and saving them
+again with `save`.
+
+Functions contained in module.
+------------------------------
+- save(fname, plot_entries, labels, style=None)
+- load(fname)
+- draw(plot_entries, labels, style=None, columns=None)
+- render(fname, out_fname, dpi=300)
+
+Individual documentation can be accessed by using the following commands:
+>>> import figure_spec
+>>> print figure_spec.<function_name>.__doc__  # or
+>>> help(figure_spec.<function_name>)
+
+@author: elvd
+
+"""
+
+from __future__ import print_function
+import json
+import numpy as np
+import matplotlib.pyplot as plt
+import elvd_tools
+
+
+# same style as `elvd_tools.custom_plot`, used when a spec does not set one
+default_style = {'colours': elvd_tools.line_colours,
+                 'line_width': 1.0,
+                 'legend_loc': 'lower right'}
+
+# bump when the layout of spec files changes
+_spec_version = 1
+
+
+def save(fname, plot_entries, labels, style=None):
+    """
+    Saves a figure spec.
+
+    Parameters:
+    -----------
+    fname : str
+        Path of the spec file, `.npz` is appended if missing.
+    plot_entries : list of numpy.ndarray
+        The datasets drawn, datapoints in rows, X and Y in the first two
+        columns.
+    labels : dict
+        The `xlabel`, `ylabel`, `title` and `legend` of the figure. The
+        legend can be None.
+    style : dict, optional
+        Any entries of `default_style` to override.
+
+    Notes:
+    ------
+    Only the first two columns of each dataset are kept.
+
+    """
+
+    record = {'version': _spec_version, 'labels': labels,
+              'style': style or dict()}
+    arrays = dict(('data_%d' % n, np.asarray(plot_entry)[:, :2]) for
+                  (n, plot_entry) in enumerate(plot_entries))
+    np.savez_compressed(fname, record=np.array(json.dumps(record)), **arrays)
+
+
+def load(fname):
+    """
+    Reads a figure spec.
+
+    Parameters:
+    -----------
+    fname : str
+        Path of the spec file.
+
+    Returns:
+    --------
+    plot_entries : list of numpy.ndarray
+        The datasets drawn.
+    labels : dict
+        The labels of the figure.
+    style : dict
+        Entries of `default_style` overridden by the figure.
+
+    Raises:
+    -------
+    ValueError
+        In case the file was written by a newer version of this module.
+
+    """
+
+    with np.load(fname) as stored:
+        record = json.loads(str(stored['record']))
+        if record['version'] > _spec_version:
+            raise ValueError('Unsupported figure spec version')
+        plot_entries = [stored['data_%d' % n] for n in
+                        range(len(stored.files) - 1)]
+
+    return (plot_entries, record['labels'], record['style'])
+
+
+def draw(plot_entries, labels, style=None, columns=None):
+    """
+    Draws a figure from its spec.
+
+    Parameters:
+    -----------
+    plot_entries : list of numpy.ndarray
+        The datasets to draw, see `save`.
+    labels : dict
+        The labels of the figure, see `save`.
+    style : dict, optional
+        Any entries of `default_style` to override.
+    columns : int, optional
+        If given, dense datasets are reduced to the points needed to draw
+        them over this many pixel columns, see `elvd_tools.decimate`.
+
+    Returns:
+    --------
+    fig : matplotlib.figure.Figure
+        The figure. It is up to the calling function to display and/or save
+        it, and to close it afterwards.
+
+    """
+
+    figure_style = dict(default_style)
+    figure_style.update(style or dict())
+
+    elvd_tools.apply_style()
+    fig = plt.figure()
+    ax1 = fig.add_subplot(111)
+    elvd_tools.style_axes(ax1)
+
+    colours = figure_style['colours']
+    for (n, plot_entry) in enumerate(plot_entries):
+        if columns is not None:
+            plot_entry = elvd_tools.decimate(plot_entry, columns)
+        ax1.plot(plot_entry[:, 0], plot_entry[:, 1],
+                 lw=figure_style['line_width'],
+                 color=colours[n % len(colours)])
+
+    ax1.set_xlabel(labels['xlabel'])
+    ax1.set_ylabel(labels['ylabel'])
+    ax1.set_title(labels['title'])
+    if labels.get('legend') is not None:
+        ax1.legend(labels['legend'], loc=figure_style['legend_loc'])
+
+    return fig
+
+
+def render(fname, out_fname, dpi=300):
+    """
+    Draws a figure from a spec file, and saves it as an image.
+
+    Parameters:
+    -----------
+    fname : str
+        Path of the spec file.
+    out_fname : str
+        Path of the image, its extension sets the format.
+    dpi : int, optional
+        Resolution of the image.
+
+    Notes:
+    ------
+    Dense datasets are reduced to what can be seen at `dpi`, see `draw`.
+    Closes the figure once saved. Safe to run in a separate process.
+
+    """
+
+    columns = elvd_tools.pixel_columns(dpi)
+    fig = draw(*load(fname), columns=columns)
+    fig.savefig(out_fname, dpi=dpi)
+    plt.close(fig)
+
+if __name__ == '__main__':
+    print(__doc__)
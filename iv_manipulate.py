@@ -7,7 +7,9 @@ Functions contained in module.
 ------------------------------
 - make_symmetric(data, quadrant)
 - scale(data, factor)
-- extract_region(data, region)
+- extract_region(data, region, method, delta, min_confidence)
+- find_region_bounds(data, delta, smooth)
+- IVPipeline(steps)
 
 Individual documentation can be accessed by using the following commands:
 >>> import iv_manipulate
@@ -20,6 +22,7 @@ Created on Tue Aug 19 17:01:45 2014
 """
 
 from __future__ import print_function
+import warnings
 import numpy as np
 import scipy.signal as spsig
 
@@ -63,29 +66,7 @@ def make_symmetric(data, quadrant='pos'):
     if np.size(data, 0) < np.size(data, 1):
         data = data.T  # make sure data is in columns
 
-    new_data = data.copy()  # do not change original data
-
-    # create a boolean mask to extract region
-    if quadrant == 'pos':
-        elements_mask = np.where(new_data[:, 0] >= 0.0)
-    elif quadrant == 'neg':
-        elements_mask = np.where(new_data[:, 0] <= 0.0)
-    else:
-        raise ValueError('Invalid value for quadrant')
-
-    elements_mask = elements_mask[0]
-    new_data = new_data[elements_mask]
-
-    mirror_data = new_data * -1
-    mirror_data = np.flipud(mirror_data)
-
-    # newly symmetric I-V
-    if quadrant == 'pos':
-        new_data = np.concatenate((mirror_data, new_data))
-    else:
-        new_data = np.concatenate((new_data, mirror_data))
-
-    return new_data
+    return _symmetric(data, quadrant)
 
 
 def scale(data, factor):
@@ -126,14 +107,15 @@ def scale(data, factor):
         data = data.T  # make sure data is in columns
 
     # match data types for float multiplication/division
-    new_data = data.copy().astype(float)
+    new_data = np.array(data, dtype=float)
 
     new_data[:, 1] *= factor
 
     return new_data
 
 
-def extract_region(data, region='pdr'):
+def extract_region(data, region='pdr', method='argrel', delta=0.05,
+                   min_confidence=0.1):
     """
     Extracts a part of the measured I-V that is of interest. Possible
     regions are either the initial Positive Differential Resistance one, or the
@@ -145,6 +127,14 @@ def extract_region(data, region='pdr'):
         I-V data of one device.
     region : {'pdr', 'ndr'}, optional
         Which region of the RTD's I-V to extract.
+    method : {'argrel', 'prominence'}, optional
+        How local minima and maxima are found, see Notes.
+    delta : float, optional
+        With 'prominence', the prominence a peak needs, see
+        `find_region_bounds`.
+    min_confidence : float, optional
+        With 'prominence', a RuntimeWarning is issued if the confidence in
+        the peaks found is below this, see `find_region_bounds`.
 
     Returns:
     --------
@@ -155,9 +145,11 @@ def extract_region(data, region='pdr'):
     -------
     IndexError
         In case the data array has more than 2 dimensions, i.e. data for more
-        than one device.
+        than one device. With 'argrel', also in case the minimum or maximum
+        cannot be found.
     ValueError
-        In case an invalid parameter is specified for the `region` variable.
+        In case an invalid parameter is specified for the `region` or
+        `method` variables.
 
     Notes:
     ------
@@ -171,6 +163,11 @@ def extract_region(data, region='pdr'):
     concatenated together. The first part spans from the value with smallest
     `x` component to the last minimum before `x` = 0; and the second part is
     from the first maximum after `x` = 0, up to the value with largest `x`.
+    With 'argrel', extrema are those that are the smallest or largest value
+    100 datapoints either side, in both columns. With 'prominence', they are
+    found in the current with `find_region_bounds`, which is faster and
+    tolerates noise; if one is missing, the region extends to the end of
+    the data instead of failing, and a warning is issued.
 
     """
 
@@ -180,18 +177,317 @@ def extract_region(data, region='pdr'):
     if np.size(data, 0) < np.size(data, 1):
         data = data.T  # make sure data is in columns
 
-    new_data = data.copy()  # do not change original data
+    new_data = _region(data, region, method, delta, min_confidence)
+    if region == 'pdr':  # a view, copy only the region
+        new_data = new_data.copy()
+
+    return new_data
+
+
+def find_region_bounds(data, delta=0.05, smooth=0.02):
+    """
+    Finds the boundaries of the initial Positive Differential Resistance
+    region of an I-V, i.e. the peaks of the current either side of the
+    origin.
+
+    Parameters:
+    -----------
+    data : numpy.ndarray
+        I-V data of one device, datapoints in rows.
+    delta : float, optional
+        Prominence a peak needs, as a fraction of the full range of the
+        current. Smaller changes in the current are treated as noise.
+    smooth : float, optional
+        Width of the window the current is smoothed over before looking for
+        peaks, as a fraction of the number of datapoints. 0 to not smooth.
+
+    Returns:
+    --------
+    first_peak : int
+        Index of the last minimum of the current at `x` <= 0, or 0 if there
+        is none.
+    second_peak : int
+        Index of the first maximum of the current at `x` >= 0, or the number
+        of datapoints if there is none.
+    confidence : float
+        Smallest prominence of the two peaks, as a fraction of the full range
+        of the current, between 0 and 1. 0 if either peak is missing.
+
+    Notes:
+    ------
+    Requires an installation of NumPy and SciPy. The current is smoothed
+    with a Savitzky-Golay filter, then peaks are found with
+    `scipy.signal.find_peaks`, keeping only those with a prominence of at
+    least `delta`. Each peak is then moved to the extreme of the measured
+    current within the smoothing window. Unlike `scipy.signal.argrelmin`,
+    noise never produces a peak, as long as it is well below `delta` once
+    smoothed. NaN values are ignored.
+
+    """
+
+    data = np.asarray(data)
+    valid = np.flatnonzero(~np.isnan(data[:, 0]) & ~np.isnan(data[:, 1]))
+    voltage = data[valid, 0]
+    current = data[valid, 1]
+
+    # odd window, wide enough for a quadratic, narrower than the data
+    window = int(smooth * np.size(current)) // 2 * 2 + 1
+    if 5 <= window <= np.size(current):
+        smoothed = spsig.savgol_filter(current, window, 2)
+    else:
+        smoothed = current
+        window = 1
+
+    span = float(np.max(smoothed) - np.min(smoothed)) if \
+        np.size(smoothed) else 0.0
+
+    # minima are the maxima of the negated current
+    maxs, max_props = spsig.find_peaks(smoothed, prominence=delta * span)
+    mins, min_props = spsig.find_peaks(-smoothed, prominence=delta * span)
+
+    first_peak, second_peak = 0, np.size(data, 0)
+    confidence = 0.0
+    neg_mins = np.flatnonzero(voltage[mins] <= 0.0)
+    pos_maxs = np.flatnonzero(voltage[maxs] >= 0.0)
+
+    half_window = window // 2
+    if np.size(neg_mins):
+        index = mins[neg_mins[-1]]
+        lower = max(index - half_window, 0)
+        index = lower + np.argmin(current[lower:index + half_window + 1])
+        first_peak = int(valid[index])
+    if np.size(pos_maxs):
+        index = maxs[pos_maxs[0]]
+        lower = max(index - half_window, 0)
+        index = lower + np.argmax(current[lower:index + half_window + 1])
+        second_peak = int(valid[index])
+    if np.size(neg_mins) and np.size(pos_maxs) and span > 0.0:
+        confidence = min(min_props['prominences'][neg_mins[-1]],
+                         max_props['prominences'][pos_maxs[0]], span)
+        confidence /= span
+
+    return (first_peak, second_peak, confidence)
+
+
+class IVPipeline(object):
+    """
+    A chain of I-V manipulations, applied in order to the I-V data of any
+    number of devices. Each device's data is copied at most once if it is
+    float, or, in in-place mode, only when a manipulation changes its length.
+
+    Parameters:
+    -----------
+    steps : list of tuples
+        The manipulations, as pairs of function name from this module and
+        keyword parameters, e.g. `('scale', {'factor': 0.1})`.
+
+    Raises:
+    -------
+    ValueError
+        In case a step is not a function of this module, or has an invalid
+        parameter.
+
+    Example:
+    --------
+    >>> import iv_manipulate
+    >>> pipeline = iv_manipulate.IVPipeline([
+    ...     ('make_symmetric', {'quadrant': 'neg'}),
+    ...     ('extract_region', {'region': 'pdr'}),
+    ...     ('scale', {'factor': 0.1})])
+    >>> results = pipeline([data1, data2, data3])
+
+    """
+
+    def __init__(self, steps):
+        self.steps = list()
+        for func_name, kwargs in steps:
+            if func_name not in _step_checks:
+                raise ValueError('Unknown manipulation %s' % func_name)
+            kwargs = dict(kwargs)
+            try:
+                _step_checks[func_name](**kwargs)
+            except TypeError:
+                raise ValueError('Invalid parameters for %s' % func_name)
+            self.steps.append((func_name, kwargs))
+
+    def __call__(self, data, inplace=False):
+        """
+        Applies the manipulations to the I-V data of a number of devices.
+
+        Parameters:
+        -----------
+        data : list of numpy.ndarray or numpy.ndarray
+            Either a list of I-V data, one array per device, or a single
+            3-D array of all devices, with datapoints of each device in rows.
+            In the latter case, devices with fewer datapoints are padded at
+            the end with rows of NaN.
+        inplace : bool, optional
+            If True, `data` itself is changed wherever possible, e.g. when
+            scaling. Otherwise, it is left untouched.
+
+        Returns:
+        --------
+        new_data : list of numpy.ndarray
+            The manipulated I-V data of each device, with datapoints in
+            different rows.
+
+        Raises:
+        -------
+        IndexError
+            In case the data of a device has other than 2 dimensions.
+
+        Notes:
+        ------
+        In in-place mode, scaling steps at the start are applied to a 3-D
+        float array of all devices at once. Scaling steps just before
+        `make_symmetric` are applied to its result instead, which gives the
+        same values without copying the data first.
+
+        """
+
+        steps = self.steps
+        if isinstance(data, np.ndarray) and np.ndim(data) == 3:
+            stack = data
+            if np.size(stack, 1) < np.size(stack, 2):
+                stack = stack.transpose(0, 2, 1)  # data in columns
+
+            # leading scaling steps, for all devices at once, if no copy
+            if inplace and stack.dtype.kind == 'f':
+                while steps and steps[0][0] == 'scale':
+                    stack[:, :, 1] *= steps[0][1]['factor']
+                    steps = steps[1:]
+
+            # strip padding, keeping views of `stack`
+            lengths = np.sum(~np.isnan(stack[:, :, 0]), axis=1)
+            curves = [(device[:length], False) for (device, length) in
+                      zip(stack, lengths)]
+        else:
+            curves = list()
+            for device in data:
+                if np.ndim(device) != 2:  # one IV dataset per device
+                    raise IndexError('Incorrect data format')
+                if np.size(device, 0) < np.size(device, 1):
+                    device = device.T  # make sure data is in columns
+                curves.append((device, False))
+
+        new_data = list()
+        for curve, owned in curves:
+            factors = list()  # scaling deferred past `make_symmetric`
+            for func_name, kwargs in steps:
+                if func_name == 'scale':
+                    factors.append(kwargs['factor'])
+                elif func_name == 'make_symmetric':
+                    curve = _symmetric(curve, **kwargs)
+                    owned = True
+                else:  # extract_region, bounds depend on the scaling
+                    curve, owned = _scaled(curve, factors, owned, inplace)
+                    factors = list()
+                    curve = _region(curve, **kwargs)
+                    owned = owned or kwargs.get('region', 'pdr') == 'ndr'
+            curve, owned = _scaled(curve, factors, owned, inplace)
+
+            if not owned and not inplace:  # do not return views of `data`
+                curve = curve.copy()
+            new_data.append(curve)
+
+        return new_data
+
+
+def _symmetric(data, quadrant='pos'):
+    """
+    Makes an I-V anti-symmetric, see `make_symmetric`. `data` must be in
+    columns, and is not changed. Builds the result with a single allocation.
+
+    """
+
+    # create a boolean mask to extract region
+    if quadrant == 'pos':
+        half = data[data[:, 0] >= 0.0]
+    elif quadrant == 'neg':
+        half = data[data[:, 0] <= 0.0]
+    else:
+        raise ValueError('Invalid value for quadrant')
+
+    num_points = np.size(half, 0)
+    new_data = np.empty((2 * num_points, np.size(half, 1)), dtype=half.dtype)
+
+    # newly symmetric I-V, half plus its rotation around the origin
+    if quadrant == 'pos':
+        np.negative(half[::-1], out=new_data[:num_points])
+        new_data[num_points:] = half
+    else:
+        new_data[:num_points] = half
+        np.negative(half[::-1], out=new_data[num_points:])
+
+    return new_data
+
+
+def _scaled(data, factors, owned, inplace):
+    """
+    Scales the current of an I-V by a number of factors, in order, for an
+    `IVPipeline`. `data` is copied first, unless it is float, and either a
+    copy already or may be changed. Returns the scaled data, and whether it
+    is a copy.
+
+    """
+
+    if factors:
+        if data.dtype.kind != 'f' or not (owned or inplace):
+            data = data.astype(float)
+            owned = True
+        for factor in factors:
+            data[:, 1] *= factor
+
+    return (data, owned)
+
+
+def _region(data, region='pdr', method='argrel', delta=0.05,
+            min_confidence=0.1):
+    """
+    Extracts a region of an I-V, see `extract_region`. `data` must be in
+    columns. The 'pdr' region is returned as a view of `data`.
+
+    """
+
+    if region not in ('pdr', 'ndr'):
+        raise ValueError('Region should be either pdr or ndr')
+
+    if method == 'argrel':
+        first_peak, second_peak = _argrel_bounds(data)
+    elif method == 'prominence':
+        first_peak, second_peak, confidence = find_region_bounds(data, delta)
+        if confidence < min_confidence:
+            warnings.warn('Region bounds found with low confidence, %.3f' %
+                          confidence, RuntimeWarning)
+    else:
+        raise ValueError('Method should be either argrel or prominence')
+
+    if region == 'pdr':
+        return data[first_peak:second_peak, :]
+
+    first_ndr = data[:first_peak, :]
+    second_ndr = data[second_peak:, :]
+    return np.concatenate((first_ndr, second_ndr))
+
+
+def _argrel_bounds(data):
+    """
+    Finds the last minimum before `x` = 0 and the first maximum after it, as
+    local extrema over 100 datapoints either side. Raises IndexError if
+    there is no such extremum.
+
+    """
 
     # find local minima and maxima
-    local_min_indices = spsig.argrelmin(new_data, order=100)
-    local_max_indices = spsig.argrelmax(new_data, order=100)
+    local_min_indices = spsig.argrelmin(data, order=100)
+    local_max_indices = spsig.argrelmax(data, order=100)
 
     # extract indices from returned data structure
     local_min_indices = local_min_indices[0]
     local_max_indices = local_max_indices[0]
 
-    local_min_values = new_data[local_min_indices]
-    local_max_values = new_data[local_max_indices]
+    local_min_values = data[local_min_indices]
+    local_max_values = data[local_max_indices]
 
     # split into extrema in I and III quadrant
     neg_mins_indices = np.where(local_min_values[:, 0] <= 0.0)
@@ -202,18 +498,32 @@ def extract_region(data, region='pdr'):
     pos_max_indices = pos_max_indices[0]
     pos_max_indices = local_max_indices[pos_max_indices]
 
-    if region == 'pdr':
-        first_peak = neg_mins_indices[-1]
-        second_peak = pos_max_indices[0]
-        new_data = new_data[first_peak:second_peak, :]
-    elif region == 'ndr':
-        first_ndr = new_data[:neg_mins_indices[-1], :]
-        second_ndr = new_data[pos_max_indices[0]:, :]
-        new_data = np.concatenate((first_ndr, second_ndr))
-    else:
+    return (neg_mins_indices[-1], pos_max_indices[0])
+
+
+def _check_symmetric(quadrant='pos'):
+    if quadrant not in ('pos', 'neg'):
+        raise ValueError('Invalid value for quadrant')
+
+
+def _check_scale(factor):
+    float(factor)
+
+
+def _check_region(region='pdr', method='argrel', delta=0.05,
+                  min_confidence=0.1):
+    if region not in ('pdr', 'ndr'):
         raise ValueError('Region should be either pdr or ndr')
+    if method not in ('argrel', 'prominence'):
+        raise ValueError('Method should be either argrel or prominence')
+    float(delta)
+    float(min_confidence)
 
-    return new_data
+
+# parameter checks of the manipulations an `IVPipeline` can apply
+_step_checks = {'make_symmetric': _check_symmetric,
+                'scale': _check_scale,
+                'extract_region': _check_region}
 
 if __name__ == '__main__':
     print(__doc__)
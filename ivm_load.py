@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+A fast reader for `.ivm` files, holding DC current-voltage measurements, one
+datapoint per line after a number of header lines.
+
+The numeric body of a file is converted with a single call, instead of line
+by line. Optionally, the parsed data is kept in a binary sidecar file, which
+is memory-mapped on later reads, so each measurement file is only ever parsed
+once.
+
+Functions contained in module.
+------------------------------
+- read_header(fname, skiprows=1)
+- load(fname, skiprows=1, sidecar_dir=None)
+
+Individual documentation can be accessed by using the following commands:
+>>> import ivm_load
+>>> print ivm_load.<function_name>.__doc__  # or
+>>> help(ivm_load.<function_name>)
+
+@author: elvd
+
+"""
+
+from __future__ import print_function
+import os
+import glob
+import hashlib
+import numpy as np
+
+
+# whether `numpy.loadtxt` is implemented in C, from NumPy 1.23
+_native_loadtxt = tuple(int(part) for part in
+                        np.__version__.split('.')[:2]) >= (1, 23)
+
+
+def read_header(fname, skiprows=1):
+    """
+    Reads the header of a measurement file.
+
+    Parameters:
+    -----------
+    fname : str
+        Measurement file, absolute path.
+    skiprows : int, optional
+        Number of header lines.
+
+    Returns:
+    --------
+    header : list of str
+        The header lines, without line endings.
+
+    """
+
+    header = list()
+    with open(fname, 'rt') as file_in:
+        for line in file_in:
+            if len(header) == skiprows:
+                break
+            header.append(line.rstrip('\r\n'))
+
+    return header
+
+
+def load(fname, skiprows=1, sidecar_dir=None):
+    """
+    Reads the data of a measurement file.
+
+    Parameters:
+    -----------
+    fname : str
+        Measurement file, absolute path.
+    skiprows : int, optional
+        Number of header lines.
+    sidecar_dir : str, optional
+        Folder holding binary copies of parsed files. If the file has been
+        parsed before, and its size and modification time are still the
+        same, its data is memory-mapped from there instead. Otherwise, it is
+        parsed and added, replacing any older copy. Created if it does not
+        exist. Should not be shared with other caches.
+
+    Returns:
+    --------
+    data : numpy.ndarray
+        The measured data, datapoints in rows. When memory-mapped, changes
+        to it are never written back to the sidecar file.
+
+    Raises:
+    -------
+    ValueError
+        In case the file contains something other than numbers after the
+        header.
+
+    Notes:
+    ------
+    Values may be separated by whitespace or commas. Before NumPy 1.23,
+    files the fast path cannot parse, e.g. ones with comment lines, are read
+    with `numpy.loadtxt` instead, which is then much slower.
+
+    Example:
+    --------
+    >>> import ivm_load
+    >>> data = ivm_load.load(fname, sidecar_dir=sidecar_dir)
+    >>> data[:, 1] /= 1e-3  # convert to mA
+
+    """
+
+    if sidecar_dir is not None:
+        sidecar_prefix, sidecar_fname = _sidecar_name(sidecar_dir, fname,
+                                                      skiprows)
+        try:
+            return np.load(sidecar_fname, mmap_mode='c')
+        except (IOError, OSError, ValueError):
+            pass  # missing, or a damaged sidecar
+
+    data = _parse(fname, skiprows)
+
+    if sidecar_dir is not None:
+        _store_sidecar(sidecar_prefix, sidecar_fname, data)
+
+    return data
+
+
+def _parse(fname, skiprows):
+    """
+    Converts the body of a measurement file to an array with a single call.
+    From NumPy 1.23, `numpy.loadtxt` parses in C and is faster, so it is
+    used directly. Older versions use `numpy.fromstring`, falling back to
+    `numpy.loadtxt` if that fails.
+
+    """
+
+    if _native_loadtxt:
+        try:
+            return np.loadtxt(fname, skiprows=skiprows, ndmin=2)
+        except ValueError:  # comma separated, or not numbers at all
+            return np.loadtxt(fname, skiprows=skiprows, ndmin=2,
+                              delimiter=',')
+
+    with open(fname, 'rt') as file_in:
+        for _ in range(skiprows):
+            file_in.readline()  # header skipped, see `read_header`
+        body = file_in.read().strip()
+
+    if not body:
+        return np.empty((0, 0))
+
+    body = body.replace(',', ' ')
+    ncols = len(body.split('\n', 1)[0].split())
+    try:
+        values = np.fromstring(body, sep=' ')
+    except ValueError:  # text after the header, NumPy 1.23 or later
+        values = None
+
+    # conversion stops at the first non-number, so check nothing was lost,
+    # counting lines, as splitting the whole body costs as much as parsing
+    if values is None or ncols == 0 or \
+            values.size != ncols * (body.count('\n') + 1):
+        return np.loadtxt(fname, skiprows=skiprows, ndmin=2)
+
+    return values.reshape(-1, ncols)
+
+
+def _sidecar_name(sidecar_dir, fname, skiprows):
+    """
+    Path of the sidecar of a measurement file, and the prefix shared by all
+    its versions. The name holds the size and modification time of the file,
+    so any change to either, including an older modification time, misses.
+
+    """
+
+    key = hashlib.sha1(os.path.abspath(fname).encode('utf-8'))
+    key.update(str(skiprows).encode('ascii'))
+    prefix = os.path.join(sidecar_dir, key.hexdigest())
+
+    source_stat = os.stat(fname)
+    version = '%d_%d' % (source_stat.st_size,
+                         int(round(source_stat.st_mtime * 1e6)))
+
+    return (prefix, '_'.join([prefix, version]) + '.npy')
+
+
+def _store_sidecar(sidecar_prefix, sidecar_fname, data):
+    """
+    Saves parsed data as a sidecar, through a temporary file, so concurrent
+    readers never see a partial one. Removes sidecars of older versions of
+    the same file, so there is at most one per measurement file.
+
+    """
+
+    sidecar_dir = os.path.dirname(sidecar_fname)
+    try:
+        os.makedirs(sidecar_dir)
+    except OSError:
+        if not os.path.isdir(sidecar_dir):
+            raise
+
+    temp_fname = '.'.join([sidecar_fname, str(os.getpid()), 'tmp'])
+    with open(temp_fname, 'wb') as file_out:
+        np.save(file_out, data)
+
+    try:
+        if os.path.exists(sidecar_fname):
+            os.remove(sidecar_fname)  # Windows will not overwrite it
+        os.rename(temp_fname, sidecar_fname)
+    except OSError:  # in use, keep the one already there
+        os.remove(temp_fname)
+
+    for old_fname in glob.glob(sidecar_prefix + '_*.npy'):
+        if old_fname != sidecar_fname:
+            try:
+                os.remove(old_fname)
+            except OSError:  # in use, or already gone
+                pass
+
+if __name__ == '__main__':
+    print(__doc__)
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+An index of the files in a measurement or simulation tree, holding the
+metadata encoded in their names, e.g. device, size, sample and substrate. The
+tree is scanned once, without reading any file, and the index can be saved
+and queried, so batch jobs can pick a subset of files straight away.
+
+Names are split at `_`, and each part is matched against the patterns in
+`field_patterns`. For `.ivm` measurement files, the fourth part of the name
+is the sample, following the convention of `auto_poly_generate`. Each file
+also gets the same key as in `sim_data_load`, so selected simulation results
+can be looked up in `sim_results` directly.
+
+Functions contained in module.
+------------------------------
+- parse_name(name)
+- build_index(start_dir, extensions=('.ivm',))
+- select(index, **criteria)
+- save_index(index_fname, index)
+- load_index(index_fname)
+
+Individual documentation can be accessed by using the following commands:
+>>> import meta_index
+>>> print meta_index.<function_name>.__doc__  # or
+>>> help(meta_index.<function_name>)
+
+Example:
+--------
+>>> import meta_index
+>>> index = meta_index.build_index(startdir)
+>>> l938_d2 = meta_index.select(index, device='L938', size='D2')
+
+@author: elvd
+
+"""
+
+from __future__ import print_function
+import os
+import re
+import json
+
+
+# name parts recognised as metadata, as (field, pattern), first match wins
+field_patterns = [('device', re.compile(r'^l\d+$', re.I)),
+                  ('size', re.compile(r'^d\d+$', re.I)),
+                  ('frequency', re.compile(r'^\d+(\.\d+)?[gt]hz$', re.I)),
+                  ('substrate', re.compile(r'^(duroid|quartz)\d*$', re.I)),
+                  ('quadrant', re.compile(r'^(pos|neg)$', re.I))]
+
+
+def parse_name(name):
+    """
+    Finds the metadata in the name of a file.
+
+    Parameters:
+    -----------
+    name : str
+        File name, or any other name with parts separated by `_`, such as a
+        `sim_data_load` key. A file extension is ignored.
+
+    Returns:
+    --------
+    fields : dict
+        The metadata found, e.g. `{'device': 'L938', 'size': 'D2'}`. Device,
+        size and frequency are upper case, e.g. `424GHZ`, all other fields
+        lower case. For `.ivm` files, also the `sample`.
+
+    """
+
+    base, ext = os.path.splitext(name)
+    parts = base.split('_')
+
+    fields = dict()
+    for part in parts:
+        for field, pattern in field_patterns:
+            if field not in fields and pattern.match(part):
+                if field in ('device', 'size', 'frequency'):
+                    fields[field] = part.upper()
+                else:
+                    fields[field] = part.lower()
+                break
+
+    if ext == '.ivm' and len(parts) > 3:
+        fields['sample'] = parts[3]
+
+    return fields
+
+
+def build_index(start_dir, extensions=('.ivm',)):
+    """
+    Indexes all files in a folder tree, from their names only.
+
+    Parameters:
+    -----------
+    start_dir : str
+        Root of the folder tree.
+    extensions : tuple of str or None, optional
+        Only files with these extensions are indexed, all files if None.
+
+    Returns:
+    --------
+    index : list of dicts
+        For each file, its `dirname` and `fname`, its `key` as used by
+        `sim_data_load`, and the metadata found in its folder and file names,
+        see `parse_name`. Files are in the order of `os.walk`, sorted within
+        each folder.
+
+    Notes:
+    ------
+    Metadata in the file name takes precedence over that in folder names.
+
+    """
+
+    index = list()
+    for dirname, subdirlist, filelist in os.walk(start_dir):
+        subdirlist.sort()
+        rel_dir = os.path.relpath(dirname, start_dir)
+        dir_parts = [part for part in rel_dir.split(os.path.sep) if
+                     part != os.path.curdir]
+
+        dir_fields = dict()
+        for part in dir_parts:
+            for field, value in parse_name(part).items():
+                dir_fields.setdefault(field, value)
+
+        for fname in sorted(filelist):
+            if extensions is not None and \
+                    os.path.splitext(fname)[1] not in extensions:
+                continue
+
+            # key defined by filename plus path to it, as `sim_data_load`
+            key = '_'.join([rel_dir.replace(os.path.sep, '_'),
+                            os.path.splitext(fname)[0]])
+            record = {'dirname': dirname, 'fname': fname, 'key': key}
+            record.update(dir_fields)
+            record.update(parse_name(fname))
+            index.append(record)
+
+    return index
+
+
+def select(index, **criteria):
+    """
+    Picks the files matching all criteria from an index.
+
+    Parameters:
+    -----------
+    index : list of dicts
+        As returned by `build_index`.
+    criteria : str, list of str or callable
+        Field name and allowed value, values, or a function of the value that
+        returns True for allowed ones. Text values match regardless of case.
+
+    Returns:
+    --------
+    records : list of dicts
+        The entries of `index` that match, in the same order.
+
+    Example:
+    --------
+    >>> meta_index.select(index, device='L938', size=['D1', 'D2'])
+    >>> meta_index.select(index, substrate=lambda s: s.startswith('duroid'))
+
+    """
+
+    tests = list()
+    for field, allowed in criteria.items():
+        if callable(allowed):
+            test = allowed
+        else:
+            if not isinstance(allowed, (list, tuple, set)):
+                allowed = [allowed]
+            test = _matcher(set(str(value).lower() for value in allowed))
+        tests.append((field, test))
+
+    return [record for record in index if
+            all(field in record and test(record[field]) for
+                (field, test) in tests)]
+
+
+def save_index(index_fname, index):
+    with open(index_fname, 'wt') as file_out:
+        json.dump(index, file_out, indent=1, sort_keys=True)
+
+
+def load_index(index_fname):
+    with open(index_fname, 'rt') as file_in:
+        return json.load(file_in)
+
+
+def _matcher(allowed):
+    # tests a value against a set of lower case values
+    return lambda value: str(value).lower() in allowed
+
+if __name__ == '__main__':
+    print(__doc__)
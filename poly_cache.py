@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+An on-disk cache for polynomials fitted to measured I-V data. Entries are
+keyed by the content of the measurement file, plus all parameters used to
+process it, so a file is only ever refitted if either of these change.
+
+Each entry is a single `.npz` file, holding the polynomial coefficients, the
+fitted curve and the Agilent/Keysight ADS string.
+
+Functions contained in module.
+------------------------------
+- cache_key(fname, params)
+- load(cache_dir, key)
+- store(cache_dir, key, fit, coeffs, polynom)
+- evict(cache_dir, max_size)
+
+Individual documentation can be accessed by using the following commands:
+>>> import poly_cache
+>>> print poly_cache.<function_name>.__doc__  # or
+>>> help(poly_cache.<function_name>)
+
+@author: elvd
+
+"""
+
+from __future__ import print_function
+import os
+import hashlib
+import numpy as np
+
+
+def cache_key(fname, params):
+    """
+    Creates a cache key for a measurement file.
+
+    Parameters:
+    -----------
+    fname : str
+        Measurement file, absolute path.
+    params : object
+        All parameters used to process the file, e.g. the I-V manipulations
+        and the polynomial degree. Must have a stable `repr`.
+
+    Returns:
+    --------
+    key : str
+        Hexadecimal hash of the file contents and parameters.
+
+    """
+
+    key = hashlib.sha1()
+    with open(fname, 'rb') as file_in:
+        for block in iter(lambda: file_in.read(1 << 16), b''):
+            key.update(block)
+    key.update(repr(params).encode('utf-8'))
+
+    return key.hexdigest()
+
+
+def load(cache_dir, key):
+    """
+    Retrieves a cached fit.
+
+    Parameters:
+    -----------
+    cache_dir : str
+        Folder holding the cache.
+    key : str
+        Key, as returned by `cache_key`.
+
+    Returns:
+    --------
+    entry : tuple or None
+        The cached `(fit, coeffs, polynom)`, same as passed to `store`, or
+        None if there is no such entry.
+
+    Notes:
+    ------
+    Marks the entry as recently used, which protects it from `evict`.
+
+    """
+
+    entry_fname = os.path.join(cache_dir, key + '.npz')
+
+    try:
+        with np.load(entry_fname) as entry:
+            fit = entry['fit']
+            coeffs = entry['coeffs']
+            polynom = str(entry['polynom'])
+        os.utime(entry_fname, None)
+    except (IOError, OSError, KeyError, ValueError):
+        return None  # missing, or a damaged entry
+
+    return (fit, coeffs, polynom)
+
+
+def store(cache_dir, key, fit, coeffs, polynom):
+    """
+    Adds a fit to the cache.
+
+    Parameters:
+    -----------
+    cache_dir : str
+        Folder holding the cache. Created if it does not exist.
+    key : str
+        Key, as returned by `cache_key`.
+    fit : numpy.ndarray
+        The fitted curve, as returned by `elvd_tools.fit_poly`.
+    coeffs : numpy.ndarray
+        The polynomial coefficients, as returned by `elvd_tools.fit_poly`.
+    polynom : str
+        The polynomial in ADS format.
+
+    Notes:
+    ------
+    The entry is written to a temporary file first, so concurrent readers
+    never see a partial entry.
+
+    """
+
+    try:
+        os.makedirs(cache_dir)
+    except OSError:
+        if not os.path.isdir(cache_dir):
+            raise
+
+    entry_fname = os.path.join(cache_dir, key + '.npz')
+    temp_fname = '.'.join([entry_fname, str(os.getpid()), 'tmp'])
+
+    with open(temp_fname, 'wb') as file_out:
+        np.savez(file_out, fit=fit, coeffs=coeffs, polynom=np.array(polynom))
+
+    try:
+        os.rename(temp_fname, entry_fname)
+    except OSError:  # Windows will not overwrite an existing entry
+        os.remove(temp_fname)
+
+
+def evict(cache_dir, max_size):
+    """
+    Shrinks the cache by removing the least recently used entries.
+
+    Parameters:
+    -----------
+    cache_dir : str
+        Folder holding the cache.
+    max_size : int
+        Maximum total size of the cache, in bytes.
+
+    """
+
+    if not os.path.isdir(cache_dir):
+        return
+
+    entries = list()
+    for entry_fname in os.listdir(cache_dir):
+        if os.path.splitext(entry_fname)[1] != '.npz':
+            continue
+        entry_fname = os.path.join(cache_dir, entry_fname)
+        entry_stat = os.stat(entry_fname)
+        entries.append((entry_stat.st_mtime, entry_stat.st_size, entry_fname))
+
+    total_size = sum(entry[1] for entry in entries)
+
+    for _, size, entry_fname in sorted(entries):  # oldest first
+        if total_size <= max_size:
+            break
+        try:
+            os.remove(entry_fname)
+        except OSError:  # already gone
+            pass
+        total_size -= size
+
+if __name__ == '__main__':
+    print(__doc__)
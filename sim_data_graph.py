@@ -3,15 +3,58 @@
 A complementary script to `sim_data_load', this module uses custom XML files
 to create graphs from certain datasets that have been loaded into memory.
 
-The graphs are saved both in png and pickled format to allow for later editing.
+The graphs are saved both in png format and as a `figure_spec` file, holding
+the data and labels, to allow for later editing and re-rendering.
+
+Every suite is first expanded into independent figure jobs, each holding the
+data and labels of one figure, which are then rendered in a pool of `workers`
+processes. Figures are named after the suite, the position of the graph in
+it, and the position of the figure in the graph, so names do not depend on
+the order in which suites or figures are rendered.
+
+Suites are compiled into `Graph` records, and checked against the loaded
+datasets, before any figure is drawn, so a broken suite fails straight away.
+
+For each figure, the dataset keys and subgraphs it draws, the content hashes
+of the simulation files holding them, see `sim_data_load.source_hashes`, and
+the hash of its XML fragment are recorded in an index next to the figures.
+Figures whose inputs have not changed since they were last saved are not
+drawn again, and their data is never loaded.
+
+Functions contained in module.
+------------------------------
+- construct_legend(legend_xml)
+- compile_suite(fname)
+- validate_suite(graphs, sim_results)
+- expand_suite(fname, sim_results)
+- render_figure(job, out_dir)
+- render_suites(suite_dir, sim_results, out_dir=None, workers=1,
+                incremental=True, source_hashes=None)
 
 @author: elvd
 """
 
+from __future__ import print_function
 import os
-import pickle
+import json
+import hashlib
+import collections
+import functools
+import multiprocessing
 import lxml.etree as etree
+import matplotlib
+matplotlib.use('Agg')  # figures are only ever saved, never shown
+import numpy as np
 import matplotlib.pyplot as plt
+import sim_data_load
+import figure_spec
+import elvd_tools
+
+
+suite_dir = os.getcwd()  # folder holding the suite XML files
+out_dir = None  # where figures are saved, None for `suite_dir`
+workers = multiprocessing.cpu_count()  # processes used, 1 to run serially
+incremental = True  # only draw figures whose inputs changed
 
 
 def construct_legend(legend_xml):
@@ -21,106 +64,422 @@ def construct_legend(legend_xml):
     return legend_string
 
 
-filename_list = os.listdir(os.getcwd())
-filename_list = [filename for filename in filename_list if
-                 os.path.splitext(filename)[1] == '.xml']
+# one `<graph>` of a suite, see `compile_suite`
+Graph = collections.namedtuple('Graph', ['suite', 'number', 'separate',
+                                         'subgraphs', 'data_keys', 'xlabel',
+                                         'ylabel', 'titles', 'legend',
+                                         'xml_hash'])
 
-graph_counter = 0  # to help differentiate graphs from same XML file
 
-for filename in filename_list:
-    graph_info = etree.parse(filename)
-    graph_info_root = graph_info.getroot()
-    print 'Processing file: ', filename
+def compile_suite(fname):
+    """
+    Reads a suite XML file into a list of graphs, checking that each graph
+    has everything needed to draw it.
 
-    for graph in graph_info_root:
-        # Find how to organise subgraphs
-        subgraphs_separate = graph.find('.//*[@separate]').values()[0]
+    Parameters:
+    -----------
+    fname : str
+        Path of the suite XML file.
+
+    Returns:
+    --------
+    graphs : list of Graph
+        The graphs in the suite, in order. Each holds the name of the suite,
+        its position in it, whether subgraphs are drawn on separate figures,
+        the subgraph indices, the dataset keys, axis labels, subgraph titles
+        keyed by index, legend entries, and the hash of its XML fragment.
+
+    Raises:
+    -------
+    ValueError
+        In case any graph is missing one of its elements, or a subgraph has
+        no title. All problems in the file are reported together.
+
+    """
+
+    suite_name = os.path.splitext(os.path.basename(fname))[0]
+    graph_info_root = etree.parse(fname).getroot()
 
+    graphs = list()
+    problems = list()
+    for graph_number, graph in enumerate(graph_info_root):
+        where = '%s, graph %d: ' % (suite_name, graph_number)
+
+        subgraphs_xml = graph.find('subgraphs')
+        datasets_xml = graph.find('datasets')
         graph_labels = graph.find('labels')
+        if subgraphs_xml is None or datasets_xml is None or \
+                graph_labels is None:
+            problems.append(where + 'needs subgraphs, datasets and labels')
+            continue
+
+        # Find how to organise subgraphs
+        separate_xml = graph.find('.//*[@separate]')
+        if separate_xml is None or \
+                separate_xml.get('separate') not in ('yes', 'no'):
+            problems.append(where + "separate should be either yes or no")
+            continue
+
+        try:
+            subgraphs = tuple(int(subgraph.text) for subgraph in
+                              subgraphs_xml)
+        except (TypeError, ValueError):
+            problems.append(where + 'subgraphs should be integers')
+            continue
+
+        titles = dict()
+        for title in graph_labels.iterfind('.//*[@subgraph]'):
+            try:
+                titles.setdefault(int(title.get('subgraph')), title.text)
+            except ValueError:
+                pass
+
+        # figures are titled after the last subgraph drawn on them
+        separate = separate_xml.get('separate') == 'yes'
+        titled = subgraphs if separate else subgraphs[-1:]
+        missing_titles = [subgraph for subgraph in titled if
+                          subgraph not in titles]
+        if missing_titles:
+            problems.append(where + 'no title for subgraphs %s' %
+                            missing_titles)
+        if not subgraphs or not len(datasets_xml):
+            problems.append(where + 'nothing to draw')
+
+        legend_xml = graph_labels.find('legend')
+        xml_hash = hashlib.sha1(etree.tostring(graph,
+                                               with_tail=False)).hexdigest()
+        graphs.append(Graph(suite=suite_name, number=graph_number,
+                            separate=separate, subgraphs=subgraphs,
+                            data_keys=tuple(data_key.text for data_key in
+                                            datasets_xml),
+                            xlabel=graph_labels.findtext('xlabel'),
+                            ylabel=graph_labels.findtext('ylabel'),
+                            titles=titles,
+                            legend=(construct_legend(legend_xml) if
+                                    legend_xml is not None else None),
+                            xml_hash=xml_hash))
+
+    if problems:
+        raise ValueError('Invalid graph suite:\n' + '\n'.join(problems))
+
+    return graphs
+
+
+def validate_suite(graphs, sim_results):
+    """
+    Checks that every dataset and subgraph a suite refers to exists.
+
+    Parameters:
+    -----------
+    graphs : list of Graph
+        The graphs of a suite, as returned by `compile_suite`.
+    sim_results : Mapping
+        Datasets of each simulation file, as returned by
+        `sim_data_load.load_tree`.
+
+    Raises:
+    -------
+    ValueError
+        In case a dataset key is not in `sim_results`, or a file has fewer
+        datasets than a subgraph index needs. All problems are reported
+        together.
+
+    """
+
+    problems = list()
+    for graph in graphs:
+        where = '%s, graph %d: ' % (graph.suite, graph.number)
+        for data_key in graph.data_keys:
+            if data_key not in sim_results:
+                problems.append(where + 'no dataset %s' % data_key)
+                continue
+            num_datasets = len(sim_results[data_key])
+            missing = [subgraph for subgraph in graph.subgraphs if not
+                       -num_datasets <= subgraph < num_datasets]
+            if missing:
+                problems.append(where + '%s has no subgraphs %s' %
+                                (data_key, missing))
+
+    if problems:
+        raise ValueError('Invalid graph suite:\n' + '\n'.join(problems))
+
+
+def expand_suite(fname, sim_results):
+    """
+    Expands a suite XML file into independent figure jobs.
+
+    Parameters:
+    -----------
+    fname : str
+        Path of the suite XML file.
+    sim_results : Mapping
+        Datasets of each simulation file, as returned by
+        `sim_data_load.load_tree`.
+
+    Returns:
+    --------
+    jobs : list of tuples
+        One `(figure_name, plot_entries, labels, sources)` per figure.
+        `plot_entries` is a list of the arrays to draw, `labels` a dict with
+        the axis labels, title and legend, and `sources` a dict with the
+        dataset keys and subgraph indices drawn, and the hash of the graph
+        XML fragment.
+
+    Raises:
+    -------
+    ValueError
+        In case the suite is invalid, see `compile_suite` and
+        `validate_suite`.
+
+    Notes:
+    ------
+    Figures are named `<suite>_<graph>_<figure>`, where `<graph>` is the
+    position of the graph in the suite and `<figure>` the position of the
+    figure within the graph, both starting from 0.
+
+    """
+
+    graphs = compile_suite(fname)
+    validate_suite(graphs, sim_results)
+
+    return [_figure_job(figure, sim_results) for graph in graphs for
+            figure in _graph_figures(graph)]
+
+
+def _graph_figures(graph):
+    """
+    Splits a graph into its figures, as `(figure_name, labels, sources)`,
+    without touching any data. See `expand_suite`.
+
+    """
+
+    if graph.separate:
+        # one figure per subgraph, all datasets on it
+        figures = [(graph.data_keys, [subgraph]) for subgraph in
+                   graph.subgraphs]
+    else:
+        # one figure per dataset, all subgraphs on it
+        figures = [([data_key], graph.subgraphs) for data_key in
+                   graph.data_keys]
+
+    graph_figures = list()
+    for figure_number, (fig_keys, fig_subgraphs) in enumerate(figures):
+        # title of the last subgraph drawn
+        labels = {'xlabel': graph.xlabel, 'ylabel': graph.ylabel,
+                  'title': graph.titles[fig_subgraphs[-1]],
+                  'legend': graph.legend}
+
+        figure_name = '_'.join([graph.suite, str(graph.number),
+                                str(figure_number)])
+        sources = {'datasets': list(fig_keys),
+                   'subgraphs': list(fig_subgraphs), 'xml': graph.xml_hash}
+        graph_figures.append((figure_name, labels, sources))
+
+    return graph_figures
+
+
+def _figure_job(figure, sim_results):
+    # adds the data to draw to a figure from `_graph_figures`, loading it
+    figure_name, labels, sources = figure
+    plot_entries = [sim_results[data_key][subgraph] for
+                    data_key in sources['datasets'] for
+                    subgraph in sources['subgraphs']]
+    return (figure_name, plot_entries, labels, sources)
+
+
+def render_figure(job, out_dir):
+    """
+    Draws a single figure, and saves it in png format and as a figure spec.
+
+    Parameters:
+    -----------
+    job : tuple
+        The figure to draw, as returned by `expand_suite`.
+    out_dir : str
+        Folder where the figure is saved.
+
+    Returns:
+    --------
+    figure_name : str
+        Name of the figure, without extension.
+
+    Notes:
+    ------
+    Works with absolute paths only, and closes the figure once saved. Safe to
+    run in a separate process.
+
+    """
+
+    figure_name, plot_entries, labels = job[:3]
+
+    graph_filename = os.path.join(out_dir, figure_name)
+    # reduce dense datasets to what can be seen at 300 dpi
+    fig = figure_spec.draw(plot_entries, labels,
+                           columns=elvd_tools.pixel_columns(300))
+    fig.savefig(graph_filename + '.png', dpi=300)
+    plt.close(fig)
+    figure_spec.save(graph_filename + '.npz', plot_entries, labels)
+
+    return figure_name
+
+
+def render_suites(suite_dir, sim_results, out_dir=None, workers=1,
+                  incremental=True, source_hashes=None):
+    """
+    Draws the figures of every suite XML file in a folder.
+
+    Parameters:
+    -----------
+    suite_dir : str
+        Folder holding the suite XML files.
+    sim_results : Mapping
+        Datasets of each simulation file, see `expand_suite`.
+    out_dir : str, optional
+        Folder where figures are saved, `suite_dir` if None. Created if it
+        does not exist.
+    workers : int, optional
+        Number of processes to spread the figures over. With 1, all figures
+        are drawn serially in the current process.
+    incremental : bool, optional
+        If True, figures whose datasets, subgraphs, source files and XML
+        fragment are unchanged since they were last saved in `out_dir`, and
+        whose files still exist, are skipped. Otherwise, every figure is
+        drawn.
+    source_hashes : Mapping, optional
+        Content hash of each simulation file, as returned by
+        `sim_data_load.source_hashes`. If None, the datasets themselves are
+        hashed instead, which loads all of them.
+
+    Returns:
+    --------
+    figure_names : list of str
+        Names of the figures drawn, in suite order.
+
+    Notes:
+    ------
+    All suites are compiled, and the figures to draw checked and loaded,
+    before anything is drawn, so a missing dataset is reported before any
+    time is spent rendering. Datasets only drawn on skipped figures are
+    never loaded, e.g. from a `sim_data_load.LazySimResults`. The index of
+    figures is kept in `graph_index.json` in `out_dir`.
+
+    """
+
+    if out_dir is None:
+        out_dir = suite_dir
+    out_dir = os.path.abspath(out_dir)
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+
+    filename_list = sorted(filename for filename in os.listdir(suite_dir) if
+                           os.path.splitext(filename)[1] == '.xml')
+
+    figures = list()
+    for filename in filename_list:
+        print('Processing file: ', filename)
+        for graph in compile_suite(os.path.join(suite_dir, filename)):
+            figures.extend((graph, figure) for figure in
+                           _graph_figures(graph))
+
+    if source_hashes is None:  # hash the datasets, loading all of them
+        data_keys = set(data_key for (graph, figure) in figures for
+                        data_key in figure[2]['datasets'] if
+                        data_key in sim_results)
+        source_hashes = dict((data_key, _data_hash(sim_results[data_key]))
+                             for data_key in data_keys)
+
+    index = dict()
+    if incremental:
+        index = _read_index(out_dir)
+
+    # only draw figures whose inputs differ from those in the index
+    records = dict((figure[0], _figure_record(figure[2], source_hashes)) for
+                   (graph, figure) in figures)
+    figures = [(graph, figure) for (graph, figure) in figures if
+               index.get(figure[0]) != records[figure[0]] or
+               not _figure_saved(out_dir, figure[0])]
+
+    # check the datasets and subgraphs drawn, per graph
+    parts = collections.OrderedDict()
+    for graph, (figure_name, labels, sources) in figures:
+        graph, data_keys, subgraphs = parts.setdefault(
+            (graph.suite, graph.number), (graph, list(), list()))
+        data_keys.extend(data_key for data_key in sources['datasets'] if
+                         data_key not in data_keys)
+        subgraphs.extend(subgraph for subgraph in sources['subgraphs'] if
+                         subgraph not in subgraphs)
+    validate_suite([graph._replace(data_keys=tuple(data_keys),
+                                   subgraphs=tuple(subgraphs)) for
+                    (graph, data_keys, subgraphs) in parts.values()],
+                   sim_results)
+
+    jobs = [_figure_job(figure, sim_results) for (graph, figure) in figures]
+
+    render_job = functools.partial(render_figure, out_dir=out_dir)
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+        try:
+            figure_names = pool.map(render_job, jobs, chunksize=4)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        figure_names = [render_job(job) for job in jobs]
+
+    _write_index(out_dir, records)
+
+    return figure_names
+
+
+# bump when figures are drawn differently, so all are drawn again
+_style_version = 2
+
+
+def _figure_record(sources, source_hashes):
+    # identifies the inputs of a figure in the index, without its data
+    return {'datasets': list(sources['datasets']),
+            'subgraphs': list(sources['subgraphs']),
+            'sources': [source_hashes.get(data_key) for data_key in
+                        sources['datasets']],
+            'xml': sources['xml'], 'style': _style_version}
+
+
+def _data_hash(datasets):
+    # stands in for the hash of a file, from the datasets parsed from it
+    data_hash = hashlib.sha1()
+    for dataset in datasets:
+        dataset = np.ascontiguousarray(dataset)
+        data_hash.update(str(dataset.shape).encode('ascii'))
+        data_hash.update(dataset.tobytes())
+    return data_hash.hexdigest()
+
+
+def _figure_saved(out_dir, figure_name):
+    graph_filename = os.path.join(out_dir, figure_name)
+    return all(os.path.exists(graph_filename + ext) for ext in
+               ('.png', '.npz'))
+
+
+def _read_index(out_dir):
+    try:
+        with open(os.path.join(out_dir, 'graph_index.json'), 'rt') as file_in:
+            return json.load(file_in)
+    except (IOError, OSError, ValueError):
+        return dict()
+
+
+def _write_index(out_dir, index):
+    with open(os.path.join(out_dir, 'graph_index.json'), 'wt') as file_out:
+        json.dump(index, file_out, indent=1, sort_keys=True)
 
-        if subgraphs_separate == 'yes':
-            for subgraph in graph.find('subgraphs'):
-                # uses same style as `elvd_tools.custom_plot'`
-                fig = plt.figure()
-                ax1 = fig.add_subplot(111)
-                ax1.set_color_cycle(['r', 'k', 'b', 'g', 'c', 'm'])
-
-                for data_key in graph.find('datasets'):
-                    plot_entry = sim_results[data_key.text][int(subgraph.text)]
-                    ax1.plot(plot_entry[:, 0], plot_entry[:, 1], lw=1.0)
-
-                ax1.set_xlabel(graph_labels.find('xlabel').text)
-                ax1.set_ylabel(graph_labels.find('ylabel').text)
-
-                subgraph_title = ''.join([".//*[@subgraph='",
-                                         subgraph.text, "']"])
-                ax1.set_title(graph_labels.find(subgraph_title).text)
-
-                ax1.legend(construct_legend(graph_labels.find('legend')),
-                           loc='lower right')
-
-                ax1.set_axisbelow(True)
-                ax1.grid(which='both', axis='both', color='0.1', ls=':',
-                         lw=0.2)
-                ax1.tick_params(direction='out', top='off', right='off',
-                                width=0.5)
-
-                for spine in ['left', 'top', 'right', 'bottom']:
-                    ax1.spines[spine].set_linewidth(0.5)
-
-                plt.rc('font', family='serif')
-                plt.rc('legend', fontsize=12)
-                plt.rc('axes', titlesize=14)
-                plt.rc('axes', labelsize=12)
-                plt.rc('xtick', labelsize=12)
-                plt.rc('ytick', labelsize=12)
-
-                graph_filename = '_'.join([os.path.splitext(filename)[0],
-                                           str(graph_counter)])
-                graph_filename = '.'.join([graph_filename, 'pickle'])
-                plt.savefig(graph_filename, dpi=300)
-                pickle.dump(fig, file(graph_filename, 'w'))
-                graph_counter += 1
-                plt.close(fig)
-
-        else:
-            for data_key in graph.find('datasets'):
-                fig = plt.figure()
-                ax1 = fig.add_subplot(111)
-                ax1.set_color_cycle(['r', 'k', 'b', 'g', 'c', 'm'])
-
-                for subgraph in graph.find('subgraphs'):
-                    plot_entry = sim_results[data_key.text][int(subgraph.text)]
-                    ax1.plot(plot_entry[:, 0], plot_entry[:, 1], lw=1.0)
-
-                ax1.set_xlabel(graph_labels.find('xlabel').text)
-                ax1.set_ylabel(graph_labels.find('ylabel').text)
-                subgraph_title = ''.join([".//*[@subgraph='",
-                                         subgraph.text, "']"])
-                ax1.set_title(graph_labels.find(subgraph_title).text)
-                ax1.legend(construct_legend(graph_labels.find('legend')),
-                           loc='lower right')
-
-                ax1.set_axisbelow(True)
-                ax1.grid(which='both', axis='both', color='0.1', ls=':',
-                         lw=0.2)
-                ax1.tick_params(direction='out', top='off', right='off',
-                                width=0.5)
-
-                for spine in ['left', 'top', 'right', 'bottom']:
-                    ax1.spines[spine].set_linewidth(0.5)
-
-                plt.rc('font', family='serif')
-                plt.rc('legend', fontsize=12)
-                plt.rc('axes', titlesize=14)
-                plt.rc('axes', labelsize=12)
-                plt.rc('xtick', labelsize=12)
-                plt.rc('ytick', labelsize=12)
-
-                graph_filename = '_'.join([os.path.splitext(filename)[0],
-                                           str(graph_counter)])
-                graph_filename = '.'.join([graph_filename, 'pickle'])
-                plt.savefig(graph_filename, dpi=300)
-                pickle.dump(fig, file(graph_filename, 'w'))
-                graph_counter += 1
-                plt.close(fig)
+if __name__ == '__main__':
+    if sim_data_load.lazy:
+        sim_results = sim_data_load.LazySimResults(sim_data_load.start_dir,
+                                                   sim_data_load.store_dir)
+    else:
+        sim_results = sim_data_load.load_tree(sim_data_load.start_dir,
+                                              sim_data_load.store_dir)[0]
+    source_hashes = sim_data_load.source_hashes(sim_data_load.start_dir,
+                                                sim_data_load.store_dir)
+    render_suites(suite_dir, sim_results, out_dir, workers, incremental,
+                  source_hashes)
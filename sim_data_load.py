@@ -9,55 +9,592 @@ file is created.
 The dictionary keys themselves are held in a separate list. The metadata, i.e.
 column labels, are saved into a second dictionary, using the same keys.
 
+Parsing the tab-separated exports is slow, so the parsed results can be kept
+in a binary store, one `.npz` file per dataset file plus an index. The index
+is a manifest of the tree, holding the path, size, modification time and
+content hash of each file. Files that have not changed since they were stored
+are read from the store instead, so only new or modified files are parsed.
+Files removed from the tree are removed from the store as well.
+
+Alternatively, `LazySimResults` offers the same dictionaries, but only loads a
+file the first time it is used.
+
+Functions contained in module.
+------------------------------
+- load_file(fname)
+- iter_datasets(fname)
+- store_file(store_dir, dict_key, datasets, labels)
+- load_stored(store_dir, dict_key)
+- load_tree(start_dir, store_dir=None)
+- walk_tree(start_dir)
+- source_hashes(start_dir, store_dir=None)
+- LazySimResults(start_dir, store_dir=None, max_resident=32)
+
 @author: elvd
 """
 
+from __future__ import print_function
 import os
+import re
 import csv
+import json
+import hashlib
+import collections
 import numpy as np
 
+try:
+    from collections.abc import Mapping
+except ImportError:  # Python 2
+    from collections import Mapping
+
 
 start_dir = '/var/host/media/removable/UNTITLED/projects/phd_helper/sim_data/'
+# parsed results kept here, outside `start_dir`, None to always parse
+store_dir = os.path.normpath(start_dir) + '_store'
+lazy = False  # only load files when first used, see `LazySimResults`
+
+
+def load_file(fname):
+    """
+    Parses a tab-separated simulation export.
+
+    Parameters:
+    -----------
+    fname : str
+        Absolute path of the file.
+
+    Returns:
+    --------
+    datasets : list of numpy.ndarray
+        The individual datasets in the file, datapoints in rows.
+    labels : list of lists
+        The column labels, as found in the file.
+
+    Raises:
+    -------
+    ValueError
+        In case a block of data contains something other than numbers, or
+        rows of different length.
+
+    Notes:
+    ------
+    Label rows are located in a single scan of the file, then each block of
+    data between them is converted with one vectorised call. `<invalid>`
+    values are returned as NaN.
+
+    """
+
+    with open(fname, 'rt') as file_in:
+        text = '\n' + file_in.read()  # every row now starts after a newline
+
+    try:
+        return _parse_text(text, _label_start)
+    except ValueError:  # a label row starting with a digit, check every row
+        return _parse_text(text, _label_line)
+
+
+def iter_datasets(fname):
+    """
+    Parses a tab-separated simulation export one dataset at a time, so that
+    only a single dataset is ever held in memory.
+
+    Parameters:
+    -----------
+    fname : str
+        Absolute path of the file.
+
+    Yields:
+    -------
+    labels : list of lists
+        The column label rows preceding the dataset, usually just one.
+    dataset : numpy.ndarray or None
+        The dataset, datapoints in rows. None only for label rows at the end
+        of a file, with no data after them.
+
+    Raises:
+    -------
+    ValueError
+        In case a block of data contains rows of different length.
+
+    Notes:
+    ------
+    Concatenating all `labels`, and collecting all datasets, gives the same
+    result as `load_file`. Each dataset is still converted with a single
+    vectorised call, but rows are classified one at a time, so for files
+    that fit in memory `load_file` is faster.
+
+    Example:
+    --------
+    >>> import numpy as np
+    >>> import sim_data_load
+    >>> for labels, dataset in sim_data_load.iter_datasets(fname):
+    ...     print(labels[-1][1], np.nanmax(dataset[:, 1]))
+
+    """
+
+    labels = list()
+    block = list()
+
+    with open(fname, 'rt') as file_in:
+        for line in file_in:
+            if not line.strip():  # skip empty lines
+                continue
+            if _is_data_row(line):
+                block.append(line)  # one datapoint
+                continue
+            if block:  # reached the start of new dataset
+                yield (labels, _parse_block(''.join(block)))
+                labels = list()
+                block = list()
+            labels.append(next(csv.reader([line.rstrip('\r\n')],
+                                          delimiter='\t')))
+
+    if block:  # handle last dataset in a file
+        yield (labels, _parse_block(''.join(block)))
+    elif labels:
+        yield (labels, None)
+
+
+def _parse_text(text, label_pattern):
+    """
+    Splits the contents of a file into label rows and data blocks, and
+    converts each block of data with a single call.
+
+    """
+
+    datasets = list()
+    labels = list()
+
+    # data lie between label rows, convert one block of data at a time
+    block_start = 0
+    for label_line in label_pattern.finditer(text):
+        if _is_data_row(label_line.group(1)):
+            continue
+        dataset = _parse_block(text[block_start:label_line.start(1)])
+        if dataset is not None:  # reached the start of new dataset
+            datasets.append(dataset)
+        # add data label, both x and y
+        labels.append(next(csv.reader([label_line.group(1)],
+                                      delimiter='\t')))
+        block_start = label_line.end(1)
+
+    dataset = _parse_block(text[block_start:])
+    if dataset is not None:  # handle last dataset in a file
+        datasets.append(dataset)
+
+    return (datasets, labels)
+
+
+def _is_data_row(line):
+    # a row is data if its first two fields are numbers, the second one
+    # possibly `<invalid>`
+    fields = line.rstrip('\r\n').split('\t', 2)
+    if len(fields) < 2:
+        return False
+    try:
+        float(fields[0])
+        if fields[1] != '<invalid>':
+            float(fields[1])
+    except ValueError:
+        return False
+    return True
+
+
+def _parse_block(block):
+    """
+    Converts a block of tab-separated numbers to an array, with a single
+    call. Values of `<invalid>` become NaN. Returns None for an empty block.
+
+    """
+
+    block = block.strip()
+    if not block:
+        return None
+
+    ncols = len(block.split('\n', 1)[0].split())
+    values = np.fromstring(block.replace('<invalid>', 'nan'), sep=' ')
+    if values.size % ncols:
+        raise ValueError('Uneven number of columns in data block')
+
+    return values.reshape(-1, ncols)
+
+
+# bump when parsed results change, so stored files are parsed again
+_parser_version = 2
+
+# candidate label rows, those not starting like a number; cheap to find
+_label_start = re.compile(r'\n([^-+.\d\s][^\n]*)')
+# every non-empty row, for when label rows can start like a number
+_label_line = re.compile(r'\n([^\n]*\S[^\n]*)')
+
+
+def store_file(store_dir, dict_key, datasets, labels):
+    """
+    Saves the parsed contents of a file in the binary store.
+
+    Parameters:
+    -----------
+    store_dir : str
+        Folder holding the store. Created if it does not exist.
+    dict_key : str
+        Key of the file, as used in `sim_results`.
+    datasets, labels : list
+        Parsed contents of the file, as returned by `load_file`.
+
+    Notes:
+    ------
+    Does not update the store index, that is up to the calling function.
+
+    """
+
+    if not os.path.isdir(store_dir):
+        os.makedirs(store_dir)
+
+    arrays = dict(('data_%d' % n, dataset) for (n, dataset) in
+                  enumerate(datasets))
+    np.savez(os.path.join(store_dir, dict_key + '.npz'),
+             labels=np.array(json.dumps(labels)), **arrays)
+
+
+def load_stored(store_dir, dict_key):
+    """
+    Reads the contents of a file from the binary store.
+
+    Parameters:
+    -----------
+    store_dir : str
+        Folder holding the store.
+    dict_key : str
+        Key of the file, as used in `sim_results`.
+
+    Returns:
+    --------
+    contents : tuple or None
+        The `(datasets, labels)` of the file, same as `load_file`, or None if
+        the file is not in the store.
+
+    """
+
+    try:
+        with np.load(os.path.join(store_dir, dict_key + '.npz')) as stored:
+            labels = json.loads(str(stored['labels']))
+            datasets = [stored['data_%d' % n] for n in
+                        range(len(stored.files) - 1)]
+    except (IOError, OSError, KeyError, ValueError):
+        return None
+
+    return (datasets, labels)
+
+
+def load_tree(start_dir, store_dir=None):
+    """
+    Loads all simulation results in a folder tree. Only files in folders
+    without subfolders are loaded.
+
+    Parameters:
+    -----------
+    start_dir : str
+        Root of the folder tree.
+    store_dir : str, optional
+        Folder holding a binary store of parsed files, should be outside of
+        `start_dir`. Files unchanged since they were stored are read from
+        it, all others are parsed and added to it.
+
+    Returns:
+    --------
+    sim_results : dict
+        For each file, a list of its datasets.
+    sim_results_labels : dict
+        For each file, a list of its column labels.
+    dict_key_list : list
+        The keys of both dictionaries, in the order files were found.
+
+    """
+
+    # use same key to refer to data and data labels
+    sim_results = dict()
+    sim_results_labels = dict()
+
+    # holds keys
+    dict_key_list = list()
+
+    index = dict()
+    if store_dir is not None:
+        index = _read_index(store_dir)
+    index_changed = False
+
+    for dict_key, fname in walk_tree(start_dir):
+        contents, updated = _load_contents(dict_key, fname, store_dir, index)
+        index_changed = index_changed or updated
+
+        # individual datasets stored as elements in a list
+        sim_results[dict_key], sim_results_labels[dict_key] = contents
+        dict_key_list.append(dict_key)
+
+    if store_dir is not None:
+        index_changed |= _prune_index(store_dir, index, sim_results)
+
+    if index_changed:
+        _write_index(store_dir, index)
+
+    return (sim_results, sim_results_labels, dict_key_list)
+
+
+def walk_tree(start_dir):
+    """
+    Finds all simulation results files in a folder tree. Only files in
+    folders without subfolders are considered.
+
+    Parameters:
+    -----------
+    start_dir : str
+        Root of the folder tree.
+
+    Yields:
+    -------
+    dict_key : str
+        Key of the file, the path to it relative to `start_dir` with folder
+        names joined by `_`, plus the file name without extension.
+    fname : str
+        Absolute path of the file.
+
+    """
+
+    for dirname, subdirlist, filelist in os.walk(start_dir):
+        if not subdirlist:
+            for filename in filelist:
+                # key defined by filename plus path to it
+                key_base = os.path.relpath(dirname, start_dir)
+                key_base = key_base.replace(os.path.sep, '_')
+                dict_key = '_'.join([key_base, os.path.splitext(filename)[0]])
+                # absolute path name
+                yield (dict_key, os.path.join(dirname, filename))
+
+
+def source_hashes(start_dir, store_dir=None):
+    """
+    Finds the content hash of every simulation results file in a folder
+    tree, without loading any of them.
+
+    Parameters:
+    -----------
+    start_dir : str
+        Root of the folder tree.
+    store_dir : str, optional
+        Folder holding a binary store of parsed files, see `load_tree`. The
+        hashes in its index are reused for files whose size and modification
+        time still match it, all other files are hashed.
+
+    Returns:
+    --------
+    hashes : dict
+        For each file, the SHA-1 hash of its contents, under the same key as
+        in `load_tree`.
+
+    """
+
+    index = dict()
+    if store_dir is not None:
+        index = _read_index(store_dir)
+
+    hashes = dict()
+    for dict_key, fname in walk_tree(start_dir):
+        entry = _source_entry(fname)
+        stored_entry = index.get(dict_key, dict())
+        if 'sha1' in stored_entry and \
+                all(stored_entry.get(field) == entry[field] for field in
+                    ('source', 'size', 'mtime')):
+            hashes[dict_key] = stored_entry['sha1']
+        else:
+            hashes[dict_key] = _file_hash(fname)
+
+    return hashes
+
+
+class LazySimResults(Mapping):
+    """
+    A read-only dictionary of simulation results, with the same keys and
+    values as the `sim_results` dictionary returned by `load_tree`. The
+    folder tree is indexed when the object is created, but a file is only
+    loaded the first time its key is accessed. Only the most recently used
+    files are kept in memory.
+
+    Parameters:
+    -----------
+    start_dir : str
+        Root of the folder tree.
+    store_dir : str, optional
+        Folder holding a binary store of parsed files, see `load_tree`.
+    max_resident : int, optional
+        Maximum number of files kept in memory at any time.
+
+    Attributes:
+    -----------
+    labels : Mapping
+        A matching read-only dictionary of column labels, same as the
+        `sim_results_labels` dictionary returned by `load_tree`.
+
+    Example:
+    --------
+    >>> import sim_data_load
+    >>> sim_results = sim_data_load.LazySimResults(sim_data_load.start_dir)
+    >>> sim_results_labels = sim_results.labels
+    >>> datasets = sim_results['mixer_cl_424GHz_regular_l938_d1_duroid1']
+
+    """
+
+    def __init__(self, start_dir, store_dir=None, max_resident=32):
+        self.store_dir = store_dir
+        self.max_resident = max_resident
+        self.fnames = collections.OrderedDict(walk_tree(start_dir))
+        self.labels = _LabelsView(self)
+
+        self._index = dict()
+        if store_dir is not None:
+            self._index = _read_index(store_dir)
+            if _prune_index(store_dir, self._index, self.fnames):
+                _write_index(store_dir, self._index)
+        self._resident = collections.OrderedDict()  # least recent first
+
+    def __getitem__(self, dict_key):
+        return self._contents(dict_key)[0]
+
+    def __iter__(self):
+        return iter(self.fnames)
+
+    def __len__(self):
+        return len(self.fnames)
+
+    def __contains__(self, dict_key):
+        return dict_key in self.fnames
+
+    def _contents(self, dict_key):
+        # (datasets, labels) of a file, loading it if need be
+        if dict_key in self._resident:
+            contents = self._resident.pop(dict_key)
+        else:
+            contents, updated = _load_contents(dict_key,
+                                               self.fnames[dict_key],
+                                               self.store_dir, self._index)
+            if updated:
+                _write_index(self.store_dir, self._index)
+
+        self._resident[dict_key] = contents  # now most recently used
+        while len(self._resident) > self.max_resident:
+            self._resident.popitem(last=False)
+
+        return contents
+
+
+class _LabelsView(Mapping):
+    # column labels of a `LazySimResults`, sharing its loaded files
+
+    def __init__(self, sim_results):
+        self._sim_results = sim_results
+
+    def __getitem__(self, dict_key):
+        return self._sim_results._contents(dict_key)[1]
+
+    def __iter__(self):
+        return iter(self._sim_results)
+
+    def __len__(self):
+        return len(self._sim_results)
+
+
+def _load_contents(dict_key, fname, store_dir, index):
+    """
+    Loads a file from the binary store if it is unchanged, or parses it and
+    adds it to the store otherwise. Updates `index` in place, but does not
+    save it.
+
+    A file counts as unchanged if its size and modification time match the
+    index. If only the modification time differs, e.g. after copying the
+    tree, the content hash is compared instead.
+
+    Returns the `(datasets, labels)` of the file, and whether `index` has
+    been updated.
+
+    """
+
+    if store_dir is None:
+        return (load_file(fname), False)
+
+    entry = _source_entry(fname)
+    stored_entry = index.get(dict_key, dict())
+    same_file = all(stored_entry.get(field) == entry[field] for field in
+                    ('source', 'size', 'parser'))
+
+    if same_file and stored_entry.get('mtime') == entry['mtime']:
+        contents = load_stored(store_dir, dict_key)
+        if contents is not None:
+            return (contents, False)
+
+    entry['sha1'] = _file_hash(fname)
+
+    if same_file and stored_entry.get('sha1') == entry['sha1']:
+        contents = load_stored(store_dir, dict_key)
+        if contents is not None:
+            index[dict_key] = entry  # only touched, record new mtime
+            return (contents, True)
+
+    contents = load_file(fname)
+    store_file(store_dir, dict_key, *contents)
+    index[dict_key] = entry
+
+    return (contents, True)
+
+
+def _prune_index(store_dir, index, dict_keys):
+    """
+    Removes files no longer in the tree, i.e. not in `dict_keys`, from the
+    store and from `index`. Returns whether `index` has been updated.
+
+    """
+
+    removed = [dict_key for dict_key in index if dict_key not in dict_keys]
+    for dict_key in removed:
+        del index[dict_key]
+        try:
+            os.remove(os.path.join(store_dir, dict_key + '.npz'))
+        except OSError:  # already gone
+            pass
+
+    return bool(removed)
+
+
+def _source_entry(fname):
+    # identifies a version of a source file, and of the parser, in the index
+    source_stat = os.stat(fname)
+    return {'source': fname, 'size': source_stat.st_size,
+            'mtime': source_stat.st_mtime, 'parser': _parser_version}
+
+
+def _file_hash(fname):
+    file_hash = hashlib.sha1()
+    with open(fname, 'rb') as file_in:
+        for block in iter(lambda: file_in.read(1 << 20), b''):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+def _read_index(store_dir):
+    try:
+        with open(os.path.join(store_dir, 'index.json'), 'rt') as file_in:
+            return json.load(file_in)
+    except (IOError, OSError, ValueError):
+        return dict()
+
+
+def _write_index(store_dir, index):
+    with open(os.path.join(store_dir, 'index.json'), 'wt') as file_out:
+        json.dump(index, file_out, indent=1, sort_keys=True)
 
-# use same key to refer to data and data labels
-sim_results = dict()
-sim_results_labels = dict()
-
-# holds keys
-dict_key_list = list()
-
-for dirname, subdirlist, filelist in os.walk(start_dir):
-    if not subdirlist:
-        for filename in filelist:
-            # key defined by filename plus path to it
-            key_base = os.path.relpath(dirname, start_dir)
-            key_base = key_base.replace(os.path.sep, '_')
-            dict_key = '_'.join([key_base, os.path.splitext(filename)[0]])
-            # absolute path name
-            fname = os.path.join(dirname, filename)
-
-            # individual datasets stored as elements in a list
-            sim_results[dict_key] = list()
-            sim_results_labels[dict_key] = list()
-            dict_key_list.append(dict_key)
-
-            with open(fname, 'rt') as file_in:
-                inp = csv.reader(file_in, delimiter='\t')
-                dataset = list()
-                for line in inp:
-                    if not line:  # skip empty lines
-                        continue
-                    try:  # test for rows containing data labels
-                        line[0] = float(line[0])
-                        if line[1] == '<invalid>':
-                            line[1] = 0.0  # need better way to handle
-                        else:
-                            line[1] = float(line[1])
-                        dataset.append(line)  # one datapoint
-                    except:  # add data label, both x and y
-                        sim_results_labels[dict_key].append(line)
-                        if dataset:  # reached the start of new dataset
-                            sim_results[dict_key].append(np.array(dataset))
-                        dataset = list()
-                if dataset:  # handle last dataset in a file
-                    sim_results[dict_key].append(np.array(dataset))
+if __name__ == '__main__':
+    if lazy:
+        sim_results = LazySimResults(start_dir, store_dir)
+        sim_results_labels = sim_results.labels
+        dict_key_list = list(sim_results)
+    else:
+        sim_results, sim_results_labels, dict_key_list = load_tree(start_dir,
+                                                                   store_dir)
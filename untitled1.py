@@ -1,25 +1,29 @@
 # -*- coding: utf-8 -*-
 """
-Quick script to load and open pickled matplotlib figures. Allows for manual
-editing of graph parameters before saving them in jpg format. Does not modify
-the pickled files.
+Quick script to load and open saved figure specs, see `figure_spec`. Allows
+for manual editing of graph parameters before saving them in jpg format. Does
+not modify the spec files. To re-export many figures without editing them,
+use `figure_export` instead.
 
 @author: Viktor
 """
 
+from __future__ import print_function
 import os
-import pickle
 import matplotlib.pyplot as plt
+import figure_spec
 
 
 plt.ioff()
 filenames = os.listdir(os.getcwd())
-filenames = (filename for filename in filenames if 'pickle' in filename)
+filenames = (filename for filename in filenames if
+             os.path.splitext(filename)[1] == '.npz')
 
 for filename in filenames:
-    current_fig = pickle.load(file(filename))
-    print filename
+    current_fig = figure_spec.draw(*figure_spec.load(filename))
+    print(filename)
     plt.show()
     figname = os.path.splitext(filename)[0]
     figname = '.'.join([figname, 'jpg'])
     current_fig.savefig(figname, dpi=300)
+    plt.close(current_fig)